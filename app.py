@@ -1,111 +1,74 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, abort
+from flask import Flask, render_template, request, redirect, url_for, flash, session, abort, Response, stream_template, stream_with_context, jsonify
+import datetime
 import sqlite3
-from werkzeug.security import generate_password_hash, check_password_hash
-from functools import wraps
+from werkzeug.security import generate_password_hash
+import click
+import archive
+import assets
+import categories
+import db
+import http_cache
+import passwords
+import profiling
+import sessions
+import write_behind
+from db import get_db
+from auth import login_required, admin_required
+from http_cache import cached_view
+import question_bank
+from migrations import migrate, ACADEMIC_MIGRATIONS
+from kpi import SOURCE_TABLES as KPI_SOURCE_TABLES, read_kpi_summary, rebuild_kpi_summary
+from pagination import fetch_page, iter_rows, parse_cursor
+from forms import FORMS, insert_record
+from evaluations import EVALUATIONS, MAX_SCORE, apply_evaluations
+from faculty import DOSSIER_SECTIONS, HIDDEN_COLUMNS, load_dossier
+from scoring import SOURCE_TABLES as SCORING_SOURCE_TABLES, SCORE_COMPONENTS, ScoringUnavailable, faculty_scores
+from importer import IMPORT_DATASETS, ImportFormatError, import_rows, read_rows
+from exporter import EXPORT_DATASETS, EXPORT_FORMATS, ExportFormatError, export_rows
+from versions import bump_table_versions
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'  # Change this in production!
 DATABASE = 'academic.db'
 
-# Database connection helper
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+app.config['DATABASE'] = DATABASE
+app.config['VIEW_PAGE_SIZE'] = 50
+app.config['VIEW_MAX_PAGE_SIZE'] = 500
+app.config['IMPORT_BATCH_SIZE'] = 500
+app.config['EXPORT_CHUNK_SIZE'] = 1000
+app.config['PROFILING'] = False
+app.config['PROFILING_SLOW_MS'] = 500
+# Overrides such as FLASK_DATABASE or FLASK_SQLITE_SYNCHRONOUS come from the environment
+app.config.from_prefixed_env()
+db.init_app(app)
+profiling.init_app(app)
+# Sessions live in the sessions table, see sessions.py
+sessions.init_app(app)
+passwords.init_app(app)
+# Form submissions can be queued and written in batches, see write_behind.py
+write_behind.init_app(app)
+# Closed years of records move to per-year archives, see archive.py
+archive.init_app(app)
+# Fingerprinted stylesheets, see assets.py; build them with flask build-assets
+assets.init_app(app)
+# ETags and cached pages for the read-heavy views, see http_cache.py
+http_cache.init_app(app)
+app.register_blueprint(question_bank.bp)
 
 # Initialize database
 def init_db():
-    conn = get_db_connection()
-    
-    # Create users table
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            role TEXT NOT NULL DEFAULT 'user',
-            full_name TEXT
-        )
-    ''')
-    # create questions tables 
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS questions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            question_text TEXT NOT NULL,
-            topic TEXT NOT NULL,
-            main_slo TEXT NOT NULL,
-            enabling_slos TEXT NOT NULL,
-            complexity_level TEXT NOT NULL,
-            student_level TEXT NOT NULL,
-            options TEXT NOT NULL,
-            correct_answer TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    # Update academic_data table to include user_id
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS academic_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            semester TEXT NOT NULL,
-            course_code TEXT NOT NULL,
-            num_students INTEGER,
-            teaching_load TEXT,
-            course_name TEXT,
-            theoretical_hours INTEGER,
-            practical_hours INTEGER,
-            credit_hours INTEGER,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS activity_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            activity_title TEXT,
-            activity_date TEXT,
-            duration TEXT,
-            participation_type TEXT,
-            place TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
+    conn = get_db()
+    migrate(conn, ACADEMIC_MIGRATIONS)
     
     # Create admin user if not exists
     admin_exists = conn.execute('SELECT 1 FROM users WHERE username = ?', ('admin',)).fetchone()
     if not admin_exists:
         conn.execute(
             'INSERT INTO users (username, password, role, full_name) VALUES (?, ?, ?, ?)',
-            ('admin', generate_password_hash('admin123'), 'admin', 'Administrator')
+            ('admin', generate_password_hash('admin123', app.config['PASSWORD_HASH_METHOD']), 'admin', 'Administrator')
         )
     
     conn.commit()
-    conn.close()
-
-# Login required decorator
-def login_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            flash('Please log in to access this page.', 'danger')
-            return redirect(url_for('login'))
-        return f(*args, **kwargs)
-    return decorated_function
-
-# Admin required decorator
-def admin_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            flash('Please log in to access this page.', 'danger')
-            return redirect(url_for('login'))
-        if session.get('role') != 'admin':
-            flash('You do not have permission to access this page.', 'danger')
-            return redirect(url_for('index'))
-        return f(*args, **kwargs)
-    return decorated_function
 
 @app.route('/')
 def index():
@@ -119,14 +82,27 @@ def login():
         username = request.form['username']
         password = request.form['password']
         
-        conn = get_db_connection()
+        conn = get_db()
         user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-        conn.close()
-        
-        if user and check_password_hash(user['password'], password):
+
+        # Hashing runs on the passwords.py pool; when it is saturated the
+        # login is refused rather than queued indefinitely
+        try:
+            valid = user is not None and passwords.verify_password(user['password'], password)
+            if valid and passwords.needs_rehash(user['password']):
+                conn.execute('UPDATE users SET password = ? WHERE id = ?',
+                             (passwords.hash_password(password), user['id']))
+                conn.commit()
+        except passwords.HashingBusy:
+            flash('The server is busy, please try again in a moment.', 'danger')
+            return render_template('login.html'), 503
+
+        if valid:
+            session.regenerate()
             session['user_id'] = user['id']
             session['username'] = user['username']
             session['role'] = user['role']
+            session['full_name'] = user['full_name']
             flash('Login successful!', 'success')
             return redirect(url_for('view_data'))
         else:
@@ -140,23 +116,25 @@ def register():
         username = request.form['username']
         password = request.form['password']
         full_name = request.form['full_name']
+        department = request.form.get('department', '').strip() or None
         
         if not username or not password:
             flash('Username and password are required', 'danger')
         else:
-            conn = get_db_connection()
+            conn = get_db()
             try:
                 conn.execute(
-                    'INSERT INTO users (username, password, full_name) VALUES (?, ?, ?)',
-                    (username, generate_password_hash(password), full_name)
+                    'INSERT INTO users (username, password, full_name, department) VALUES (?, ?, ?, ?)',
+                    (username, passwords.hash_password(password), full_name, department)
                 )
                 conn.commit()
                 flash('Registration successful! Please log in.', 'success')
                 return redirect(url_for('login'))
             except sqlite3.IntegrityError:
                 flash('Username already exists', 'danger')
-            finally:
-                conn.close()
+            except passwords.HashingBusy:
+                flash('The server is busy, please try again in a moment.', 'danger')
+                return render_template('register.html'), 503
     
     return render_template('register.html')
 
@@ -166,319 +144,167 @@ def logout():
     flash('You have been logged out.', 'info')
     return redirect(url_for('login'))
 
-@app.route('/semester_add', methods=['GET', 'POST'])
-@login_required
-def semester_data():
-    if request.method == 'POST':
-        # Get form data
-        data = {
-            'user_id': session['user_id'],
-            'semester': request.form['semester'],
-            'course_code': request.form['course_code'],
-            'num_students': int(request.form['num_students']) if request.form['num_students'] else None,
-            'teaching_load': request.form['teaching_load'],
-            'course_name': request.form['course_name'],
-            'semester_type': request.form['semester_type'] ,
-            'credit_hours': int(request.form['credit_hours']) if request.form['credit_hours'] else None,
-            
-        }
-
-        # Insert into database
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO academic_data (
-                user_id, semester, course_code, num_students, teaching_load,
-                course_name, semester_type, credit_hours
-                
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ? )
-        ''', tuple(data.values()))
-        conn.commit()
-        conn.close()
-
-        flash('Data added successfully!', 'success')
-        return redirect(url_for('view_data'))
-
-    return render_template('add_semester.html')
-
-
-
-@app.route('/Scientific_production', methods=['GET', 'POST'])
-@login_required
-def Scientific_production_data():
-    if request.method == 'POST':
-        # Get form data
-        data = {
-            'user_id': session['user_id'],
-            'Scientific_research': request.form['Scientific_research'],
-            'supervision_Graduation': request.form['supervision_Graduation'],
-        }
-
-        numeric_fields = [
-         'Scientific_research', 'supervision_Graduation'
-           ]
-
-        data['Scientific_sum'] = sum(int(data[field]) for field in numeric_fields)
-
-        # Insert into database
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO Scientific_production (
-                user_id, Scientific_research, supervision_Graduation, Scientific_sum
-            ) VALUES (?, ?, ?,?)
-        ''', tuple(data.values()))
-        conn.commit()
-        conn.close()
-
-        flash('Data added successfully!', 'success')
-        return redirect(url_for('view_data'))
+# Data-entry forms. Each one is declared in forms.py and served by this
+# single view, which validates the submission and runs the form's
+# precompiled INSERT.
+def form_view(name, schema):
+    def view():
+        if request.method == 'POST':
+            try:
+                values = schema['validate'](request.form)
+            except ValueError as e:
+                flash(str(e), 'danger')
+                return render_template(schema['template'], form_data=request.form), 400
 
-    return render_template('Scientific_production.html')
+            if app.config['WRITE_BEHIND']:
+                write_behind.submit(name, session['user_id'], values)
+                flash('Data received, it will appear in a moment.', 'success')
+                return redirect(url_for('view_data'))
 
-@app.route('/cirteria_add', methods=['GET', 'POST'])
-@login_required
-def cirteria_data():
-    if request.method == 'POST':
-        # Get form data
-        data = {
-            'user_id': session['user_id'],
-            'Develop_courses': request.form['Develop_courses'],
-            'Prepare_file': request.form['Prepare_file'],
-            'Electronic_tests': request.form['Electronic_tests'],
-            'Prepare_material_content': request.form['Prepare_material_content'],
-            'Use_learning_effectively': request.form['Use_learning_effectively'],
-            'teaching_methods': request.form['teaching_methods'],
-            'Methods_student': request.form['Methods_student'],
-            'preparing_test_questions': request.form['preparing_test_questions'],
-            'Provide_academic_guidance': request.form['Provide_academic_guidance']
-        }
-        numeric_fields = [
-         'Develop_courses', 'Prepare_file', 'Electronic_tests', 
-        'Prepare_material_content', 'Use_learning_effectively',
-        'teaching_methods', 'Methods_student', 'preparing_test_questions',
-        'Provide_academic_guidance'
-           ]
-
-        data['aspests_sum'] = sum(int(data[field]) for field in numeric_fields)
-
-        # Insert into database
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO Evaluation_aspects (
-                user_id, Develop_courses, Prepare_file, Electronic_tests,
-                 Prepare_material_content, Use_learning_effectively,teaching_methods,
-                 Methods_student,preparing_test_questions,Provide_academic_guidance,aspests_sum
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', tuple(data.values()))
-        conn.commit()
-        conn.close()
+            conn = get_db()
+            insert_record(conn, schema, session['user_id'], values)
+            conn.commit()
 
-        flash('Data added successfully!', 'success')
-        return redirect(url_for('view_data'))
+            flash('Data added successfully!', 'success')
+            return redirect(url_for('view_data'))
 
-    return render_template('criteria_of_evaluation.html')
+        return render_template(schema['template'])
+    return view
 
+for name, schema in FORMS.items():
+    app.add_url_rule(schema['rule'], schema['endpoint'],
+        login_required(form_view(name, schema)), methods=['GET', 'POST'])
 
-@app.route('/university_evaluation', methods=['GET', 'POST'])
+@app.route('/admin/write-behind')
 @login_required
-def university_evaluation():
-    if request.method == 'POST':
-        # Get form data
-        data = {
-            'user_id': session['user_id'],
-            'department_load': request.form['department_load'],
-            'workshop_develop': request.form['workshop_develop'],
-            'program_bank': request.form['program_bank'],
-            'medical_services': request.form['medical_services']
-        }
-        numeric_fields = [
-         'department_load', 'workshop_develop', 'program_bank', 
-        'medical_services'
-           ]
-
-        data['aspects_sum'] = sum(int(data[field]) for field in numeric_fields)
-
-        # Insert into database
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO university_evaluation (
-                user_id, department_load, workshop_develop, program_bank,
-                 medical_services,aspects_sum
-            ) VALUES (?, ?, ?, ?, ?, ?)
-        ''', tuple(data.values()))
-        conn.commit()
-        conn.close()
-
-        flash('Data added successfully!', 'success')
-        return redirect(url_for('view_data'))
-
-    return render_template('university_evaluation.html')
-
-
+@admin_required
+def write_behind_status():
+    # Queue depth and flush timings of this worker process
+    return jsonify(write_behind.status())
 
-@app.route('/prticipation_add', methods=['GET', 'POST'])
+@app.route('/view')
 @login_required
-def prticipation_data():
-    if request.method == 'POST':
-        # Get form data
-        data = {
-            'user_id': session['user_id'],
-            'location': request.form['location'],
-            'type_part': request.form['type_part'],
-            'year': request.form['year'],
-            'place': request.form['place']
-        }
-
-        # Insert into database
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO participate_conference (
-                user_id, location, type_part, place, year
-            ) VALUES (?, ?, ?, ?, ? )
-        ''', tuple(data.values()))
-        conn.commit()
-        conn.close()
+@cached_view(['users', 'academic_data', 'activity_data'])
+def view_data():
+    conn = get_db()
+    # Admin can see all data, regular users can only see their own
+    user_id = None if session.get('role') == 'admin' else session['user_id']
 
-        flash('Data added successfully!', 'success')
-        return redirect(url_for('view_data'))
+    if request.args.get('stream'):
+        # Render while reading, so even years of records are never held in memory
+        return Response(stream_template('view_data.html',
+            semseters=iter_rows(conn, 'academic_data', user_id),
+            activity=iter_rows(conn, 'activity_data', user_id),
+            streaming=True))
 
-    return render_template('Participation_in_conferences.html')
+    page_size = request.args.get('page_size', app.config['VIEW_PAGE_SIZE'], type=int)
+    page_size = min(max(page_size, 1), app.config['VIEW_MAX_PAGE_SIZE'])
+    semseters, next_semesters = fetch_page(conn, 'academic_data',
+        parse_cursor(request.args.get('semesters_after')), user_id, page_size)
+    activity, next_activity = fetch_page(conn, 'activity_data',
+        parse_cursor(request.args.get('activity_after')), user_id, page_size)
 
-@app.route('/university', methods=['GET', 'POST'])
-@login_required
-def University_Service():
-    if request.method == 'POST':
-        # Get form data
-        data = {
-            'user_id': session['user_id'],
-            'task_level': request.form['task_level'],
-            'task_type': request.form['task_type'],
-            'notes': request.form['notes'],
-        }
-
-        # Insert into database
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO University_Service (
-                user_id, task_level, task_type, notes
-            ) VALUES (?, ?, ?, ? )
-        ''', tuple(data.values()))
-        conn.commit()
-        conn.close()
-
-        flash('Data added successfully!', 'success')
-        return redirect(url_for('view_data'))
-
-    return render_template('University_Service.html')
+    return render_template('view_data.html', semseters=semseters,activity=activity,
+        next_semesters=next_semesters, next_activity=next_activity, page_size=page_size)
 
 
-@app.route('/activity_add', methods=['GET', 'POST'])
+@app.route('/admin/import', methods=['GET', 'POST'])
 @login_required
-def activity_data():
+@admin_required
+def import_data():
+    report = None
     if request.method == 'POST':
-        # Get form data
-        data = {
-            'user_id': session['user_id'],
-            'activity_title': request.form['activity_title'],
-            'activity_date': request.form['date'],
-            'duration': request.form['duration'],
-            'participation_type': request.form['participation_type'],
-            'place': request.form['place']
-        }
-
-        # Insert into database
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO activity_data (
-                user_id, activity_title, activity_date, duration, participation_type, place
-            ) VALUES (?, ?, ?, ?, ?, ? )
-        ''', tuple(data.values()))
-        conn.commit()
-        conn.close()
-
-        flash('Data added successfully!', 'success')
-        return redirect(url_for('view_data'))
+        dataset = request.form.get('dataset')
+        upload = request.files.get('file')
+        if dataset not in IMPORT_DATASETS or not upload or not upload.filename:
+            flash('Choose a dataset and a file to import.', 'danger')
+        else:
+            try:
+                rows = read_rows(upload.stream, upload.filename)
+                report = import_rows(get_db(), dataset, rows, app.config['IMPORT_BATCH_SIZE'])
+                flash(f"Imported {report['inserted']} rows, {len(report['errors'])} rejected.", 'success')
+            except ImportFormatError as e:
+                flash(str(e), 'danger')
+
+    return render_template('admin/import.html', datasets=IMPORT_DATASETS, report=report)
+
+@app.cli.command('import-data')
+@click.argument('dataset', type=click.Choice(list(IMPORT_DATASETS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def import_data_command(dataset, path):
+    """Bulk-import a CSV or XLSX file of semester, activity or research rows."""
+    with open(path, 'rb') as f:
+        try:
+            report = import_rows(get_db(), dataset, read_rows(f, path), app.config['IMPORT_BATCH_SIZE'])
+        except ImportFormatError as e:
+            raise click.ClickException(str(e))
+    for line, error in report['errors']:
+        click.echo(f'line {line}: {error}', err=True)
+    click.echo(f"Imported {report['inserted']} rows, {len(report['errors'])} rejected.")
+
+
+@app.cli.command('revoke-sessions')
+@click.argument('username', required=False)
+@click.option('--all', 'everyone', is_flag=True, help='Log out every user.')
+def revoke_sessions_command(username, everyone):
+    """Log a user (or, with --all, everyone) out of every session."""
+    conn = get_db()
+    if everyone:
+        sessions.revoke_all_sessions(conn)
+    else:
+        user = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+        if user is None:
+            raise click.BadParameter(f'no user named {username!r}', param_hint='USERNAME')
+        sessions.revoke_user_sessions(conn, user['id'])
+    conn.commit()
 
-    return render_template('add_activity.html')
 
+@app.cli.command('set-role')
+@click.argument('username')
+@click.argument('role', type=click.Choice(['user', 'admin']))
+def set_role_command(username, role):
+    """Change a user's role, including in the sessions they are logged in with."""
+    conn = get_db()
+    user = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+    if user is None:
+        raise click.BadParameter(f'no user named {username!r}', param_hint='USERNAME')
+    conn.execute('UPDATE users SET role = ? WHERE id = ?', (role, user['id']))
+    sessions.update_user_sessions(conn, user['id'], role=role)
+    conn.commit()
 
 
-@app.route('/program_add', methods=['GET', 'POST'])
+@app.route('/export/<dataset>.<fmt>')
 @login_required
-def program_data():
-    if request.method == 'POST':
-        # Get form data
-        data = {
-            'user_id': session['user_id'],
-            'scientific_output': request.form['scientific_output'],
-            'Authors_names': request.form['Authors_names'],
-            'Publisher': request.form['Publisher'],
-            'Agency': request.form['Agency'],
-            'year': request.form['year'],
-            'research_type': request.form['research_type']
-        }
-
-        # Insert into database
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO Scientific_research (
-                user_id, scientific_output, Authors_names, Publisher, Agency,
-                year, research_type
-            ) VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', tuple(data.values()))
-        conn.commit()
-        conn.close()
+@admin_required
+def export_data(dataset, fmt):
+    if dataset not in EXPORT_DATASETS or fmt not in EXPORT_FORMATS:
+        abort(404)
 
-        flash('Data added successfully!', 'success')
+    conn = get_db()
+    year = request.args.get('year', type=int)
+    try:
+        # Exports are historical reports: archived years are included
+        source = archive.history_source(conn, app.config['DATABASE'], app.config['ARCHIVE_DIR'],
+            EXPORT_DATASETS[dataset]['table'], None if year is None else [year])
+        chunks = export_rows(conn, dataset, fmt, app.config['EXPORT_CHUNK_SIZE'],
+            user_id=request.args.get('user_id', type=int),
+            semester=request.args.get('semester'),
+            year=year, source=source)
+    except (ExportFormatError, archive.ArchiveError) as e:
+        flash(str(e), 'danger')
         return redirect(url_for('view_data'))
 
-    return render_template('add_program.html')
-
-@app.route('/view')
-@login_required
-def view_data():
-    conn = get_db_connection()
-    
-    if session.get('role') == 'admin':
-        # Admin can see all data
-        semseters = conn.execute('''
-            SELECT academic_data.*, users.username, users.full_name 
-            FROM academic_data 
-            JOIN users ON academic_data.user_id = users.id
-            ORDER BY academic_data.created_at DESC
-        ''').fetchall()
-        activity = conn.execute('''
-            SELECT activity_data.*, users.username, users.full_name 
-            FROM activity_data 
-            JOIN users ON activity_data.user_id = users.id
-            ORDER BY activity_data.created_at DESC
-        ''').fetchall()
-        
-    else:
-        # Regular users can only see their own data
-        semseters = conn.execute('''
-            SELECT academic_data.*, users.username, users.full_name 
-            FROM academic_data 
-            JOIN users ON academic_data.user_id = users.id
-            WHERE academic_data.user_id = ?
-            ORDER BY academic_data.created_at DESC
-        ''', (session['user_id'],)).fetchall()
-
-        activity = conn.execute('''
-            SELECT activity_data.*, users.username, users.full_name 
-            FROM activity_data 
-            JOIN users ON activity_data.user_id = users.id
-            WHERE activity_data.user_id = ?
-            ORDER BY activity_data.created_at DESC
-        ''', (session['user_id'],)).fetchall()
-    conn.close()
-    return render_template('view_data.html', semseters=semseters,activity=activity)
+    return Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt], headers={
+        'Content-Disposition': f'attachment; filename={dataset}.{fmt}',
+    })
 
 
 @app.route('/view/Scientific_production')
 @login_required
 @admin_required
+@cached_view(['users', 'Scientific_production'])
 def view_Scientific_production():
-    conn = get_db_connection()
+    conn = get_db()
     
     # Admin can see all data
     Scientific_production = conn.execute('''
@@ -488,18 +314,18 @@ def view_Scientific_production():
         ORDER BY Scientific_production.created_at DESC
     ''').fetchall()
 
-    conn.close()
     return render_template('view_data/view_Scientific_production.html', Scientific_production=Scientific_production)
  
 @app.route('/view/criteria_of_evaluation')
 @login_required
 @admin_required
+@cached_view(['users', 'Evaluation_aspects', 'activity_data'])
 def view_criteria_of_evaluation():
-    conn = get_db_connection()
+    conn = get_db()
     
     # Admin can see all data0
     Evaluation_aspects = conn.execute('''
-        SELECT aspests_sum,evaluation_sum,user_id, users.username, users.full_name 
+        SELECT aspects_sum,evaluation_sum,user_id, users.username, users.full_name 
         FROM Evaluation_aspects 
         JOIN users ON Evaluation_aspects.user_id = users.id
         ORDER BY Evaluation_aspects.created_at DESC
@@ -512,15 +338,15 @@ def view_criteria_of_evaluation():
         ORDER BY activity_data.created_at DESC
     ''').fetchall()
         
-    conn.close()
     return render_template('view_data/view_criteria.html', Evaluation_aspects=Evaluation_aspects,activity=activity)
 
 
 @app.route('/view/university_evaluation')
 @login_required
 @admin_required
+@cached_view(['users', 'university_evaluation'])
 def view_university_evaluation():
-    conn = get_db_connection()
+    conn = get_db()
     
     # Admin can see all data0
     university_evaluation = conn.execute('''
@@ -529,53 +355,108 @@ def view_university_evaluation():
         JOIN users ON university_evaluation.user_id = users.id
         ORDER BY university_evaluation.created_at DESC
     ''').fetchall()
-    conn.close()
     return render_template('view_data/view_university.html', university_evaluation=university_evaluation)
 
 
+@app.route('/scores')
+@login_required
+@admin_required
+@cached_view(SCORING_SOURCE_TABLES)
+def view_scores():
+    year = request.args.get('year', type=int)
+    try:
+        scores = faculty_scores(get_db(), app.config['DATABASE'], year)
+    except ScoringUnavailable as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('view_kpis'))
+
+    if request.args.get('format') == 'json':
+        return jsonify(scores)
+    return render_template('view_data/view_scores.html', scores=scores, components=SCORE_COMPONENTS, year=year)
+
+
+@app.route('/faculty/<int:user_id>')
+@login_required
+@cached_view(per_user='user_id')
+def faculty_dossier(user_id):
+    # Members see their own record, admins everyone's
+    if session.get('role') != 'admin' and session['user_id'] != user_id:
+        abort(404)
+    try:
+        dossier = load_dossier(get_db(), app.config['DATABASE'], app.config['ARCHIVE_DIR'], user_id)
+    except archive.ArchiveError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('view_data'))
+    if dossier is None:
+        abort(404)
+
+    if request.args.get('format') == 'json':
+        return jsonify(dossier)
+    return render_template('view_data/faculty_dossier.html', dossier=dossier,
+        sections=DOSSIER_SECTIONS, hidden_columns=HIDDEN_COLUMNS)
+
+
+@app.route('/evaluate/<kind>', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def bulk_evaluate(kind):
+    if kind not in EVALUATIONS:
+        abort(404)
+    evaluation = EVALUATIONS[kind]
+    conn = get_db()
+
+    results = None
+    if request.method == 'POST':
+        # Inputs are named "<user_id>:<score column>"; users whose row was
+        # left completely empty are not touched
+        rows = {}
+        for name, value in request.form.items():
+            user_id, _, column = name.partition(':')
+            if value.strip():
+                rows.setdefault(user_id, {'user_id': user_id})[column] = value
+        results = apply_evaluations(conn, kind, list(rows.values()))
+
+    submissions = conn.execute(f'''
+        SELECT {evaluation['table']}.*, users.username, users.full_name
+        FROM {evaluation['table']}
+        JOIN users ON {evaluation['table']}.user_id = users.id
+        WHERE {evaluation['table']}.id IN (SELECT MAX(id) FROM {evaluation['table']} GROUP BY user_id)
+        ORDER BY users.full_name, users.username
+    ''').fetchall()
+    return render_template('admin/bulk_evaluation.html', kind=kind, evaluation=evaluation,
+        submissions=submissions, results=results, max_score=MAX_SCORE)
+
+@app.route('/api/evaluations/<kind>', methods=['POST'])
+@login_required
+@admin_required
+def bulk_evaluate_api(kind):
+    if kind not in EVALUATIONS:
+        abort(404)
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload.get('scores'), list):
+        return jsonify({'error': 'expected {"scores": [{"user_id": ..., <score column>: ...}, ...]}'}), 400
+
+    results = apply_evaluations(get_db(), kind, payload['scores'])
+    return jsonify({
+        'updated': sum(result['status'] == 'updated' for result in results),
+        'results': results,
+    })
+
+
 @app.route('/update/university/<int:id>', methods=['GET', 'POST'])
 @login_required
 def update_university(id):
     if session.get('role') == 'admin':
         if request.method == 'POST':
-            # Get form data 
-            department_load_Evaluation = request.form['department_load_Evaluation']
-            workshop_develop_Evaluation = request.form['workshop_develop_Evaluation']
-            medical_services_Evaluation = request.form['medical_services_Evaluation']
-            program_bank_Evaluation = request.form['program_bank_Evaluation']
-
-            evaluation_fields = [
-            'department_load_Evaluation',
-            'workshop_develop_Evaluation',
-            'medical_services_Evaluation',
-            'program_bank_Evaluation'
-             ]
-
-            # Calculate sum with error handling
-            try:
-                evaluation_sum = sum(int(request.form[field]) for field in evaluation_fields)
-            except ValueError as e:
-                # Handle case where a value can't be converted to int
-                evaluation_sum = 0  # or raise an exception
-                print(f"Error converting form values: {e}")
-
-            # Insert into database
-            conn = sqlite3.connect(DATABASE)
-            cursor = conn.cursor()
-
-            update_query = ''' UPDATE university_evaluation SET department_load_Evaluation == ?,
-            workshop_develop_Evaluation == ?, medical_services_Evaluation == ? ,
-            program_bank_Evaluation == ?, evaluation_sum == ?
-            WHERE university_evaluation.user_id == ? '''
-
-            cursor.execute(update_query, (department_load_Evaluation,workshop_develop_Evaluation,
-            medical_services_Evaluation,program_bank_Evaluation,evaluation_sum,id))
-            conn.commit()
-            conn.close()
-            flash('Data added successfully!', 'success')
+            # Same code path as the bulk grid, for a single user
+            result, = apply_evaluations(get_db(), 'university', [dict(request.form.to_dict(), user_id=id)])
+            if result['status'] == 'updated':
+                flash('Data added successfully!', 'success')
+            else:
+                flash(result['error'], 'danger')
             return redirect(url_for('view_data'))
 
-        conn = get_db_connection()
+        conn = get_db()
 
         # Admin can see all data
         university_evaluation = conn.execute('''
@@ -585,7 +466,6 @@ def update_university(id):
             WHERE university_evaluation.user_id = ?
             ORDER BY university_evaluation.created_at DESC
         ''',(id,)).fetchone()
-        conn.close()
 
         return render_template('admin/update_university.html',id=id, university_evaluation=university_evaluation)
     else:
@@ -596,124 +476,89 @@ def update_university(id):
 
 @app.route('/kpis')
 @login_required
+@cached_view(KPI_SOURCE_TABLES)
 def view_kpis():
-    conn = get_db_connection()
-    
-    if session.get('role') == 'admin':
-        # Admin can see all data
-        academic_kpi = conn.execute(''' 
-        SELECT COUNT(*)
-        FROM academic_data
-        ''').fetchone()
-        activity_kpi = conn.execute(''' 
-        SELECT COUNT(DISTINCT user_id)
-        FROM  activity_data
-        ''').fetchone()
-        users = conn.execute(''' 
-        SELECT COUNT(*)
-        FROM  users
-        ''').fetchone()
-        University_Service = conn.execute(''' 
-        SELECT COUNT(*)
-        FROM  University_Service
-        ''').fetchone()
-         # Admin can see all data
-
-        activity = conn.execute('''
-        SELECT activity_data.*, users.username, users.full_name 
-        FROM activity_data 
-        JOIN users ON activity_data.user_id = users.id
-        ORDER BY activity_data.created_at DESC
-        ''').fetchall()
-        accpeted_research = conn.execute('''
-        SELECT COUNT(*)
-        FROM  Scientific_research
-        WHERE research_type LIKE "%بحث مقبول%" AND Publisher LIKE "%مؤتمر%" ;
-        ''').fetchone()
-
-        research_members = conn.execute('''
-        SELECT COUNT(DISTINCT user_id)
-        FROM  Scientific_research
-        WHERE research_type LIKE "%بحث منشور%" AND Publisher LIKE "%مجلة%" ;
-        ''').fetchone()
-
-        Scientific_research2 = conn.execute('''
-        SELECT COUNT(*)
-        FROM  Scientific_research
-        WHERE research_type LIKE "%بحث منشور%" AND Publisher LIKE "%مجلة%" ;
-        ''').fetchone()
-
-        part_in_conf = conn.execute(''' 
-        SELECT COUNT(DISTINCT user_id )
-        FROM  participate_conference
-        ''').fetchone()
-
-        Evaluation_aspects = conn.execute(''' 
-        SELECT AVG(evaluation_sum)
-        FROM Evaluation_aspects
-        ''').fetchone()
-
-        Scientific_production = conn.execute(''' 
-        SELECT AVG(evaluation_sum)
-        FROM Scientific_production
-        ''').fetchone()
-
-        university_evaluation = conn.execute(''' 
-        SELECT AVG(evaluation_sum)
-        FROM university_evaluation
-        ''').fetchone()
-
-        activity_percent = (activity_kpi[0]/(users[0]-1))*100
-        members_percent = (research_members[0]/(users[0]-1))*100
-        research1_percent = (accpeted_research[0]/(users[0]-1))*100
-        conf_percent = (part_in_conf[0]/(users[0]-1))*100
-
-        return render_template('view_kpis.html', academic_kpi=academic_kpi[0],activity_kpi=activity_kpi[0],
-        activity_percent=int(activity_percent), University_Service=University_Service[0],
-        accpeted_research=accpeted_research[0],Scientific_research2=Scientific_research2[0],
-        research1_percent=int(research1_percent),members_percent=int(members_percent), conf_percent=int(conf_percent),
-        Evaluation_aspects=Evaluation_aspects[0],university_evaluation=university_evaluation[0],
-        research_members=research_members[0],Scientific_production=Scientific_production[0])
+    if session.get('role') != 'admin':
+        return redirect(url_for('view_data'))
 
-        
-    conn.close()
-    return render_template('view_data.html', semseters=semseters, activity=activity)
+    # Every figure is kept current by triggers, see kpi.py
+    kpis = read_kpi_summary(get_db())
+
+    # Percentages are relative to the faculty, i.e. every user except the admin
+    members = max(kpis['users_count'] - 1, 1)
+    activity_percent = (kpis['activity_users']/members)*100
+    members_percent = (kpis['research_members']/members)*100
+    research1_percent = (kpis['accepted_research']/members)*100
+    conf_percent = (kpis['conference_users']/members)*100
+
+    def average(total, n):
+        return kpis[total]/kpis[n] if kpis[n] else None
+
+    return render_template('view_kpis.html', academic_kpi=kpis['academic_count'],activity_kpi=kpis['activity_users'],
+    activity_percent=int(activity_percent), University_Service=kpis['university_service_count'],
+    accpeted_research=kpis['accepted_research'],Scientific_research2=kpis['published_research'],
+    research1_percent=int(research1_percent),members_percent=int(members_percent), conf_percent=int(conf_percent),
+    Evaluation_aspects=average('evaluation_aspects_total', 'evaluation_aspects_n'),
+    university_evaluation=average('university_evaluation_total', 'university_evaluation_n'),
+    research_members=kpis['research_members'],
+    Scientific_production=average('scientific_production_total', 'scientific_production_n'))
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Minify, fingerprint and precompress the stylesheets into static/dist."""
+    for name, hashed in assets.build_assets(app).items():
+        click.echo(f'{name} -> {hashed}')
+
+
+@app.cli.command('rebuild-kpis')
+def rebuild_kpis_command():
+    """Recompute the KPI summary from the source tables, e.g. after a bulk import."""
+    conn = get_db()
+    rebuild_kpi_summary(conn)
+    # The server's cached /kpis pages are keyed on the source tables
+    bump_table_versions(conn, KPI_SOURCE_TABLES)
+    conn.commit()
+
+@app.cli.command('archive-records')
+@click.option('--before', type=int, help='Archive the years before this one (default: the current year).')
+def archive_records_command(before):
+    """Move the semester, activity, research and conference rows of closed years to yearly archives."""
+    # A connection of its own: ATTACH and the copy must run on the same
+    # read-write connection, whatever SQLITE_WRITER says
+    current = datetime.date.today().year
+    if before is not None and before > current:
+        raise click.BadParameter('only closed years can be archived', param_hint='--before')
+    conn = db._connect(app.config['DATABASE'], app.config)
+    try:
+        for year in archive.closed_years(conn, before or current):
+            moved = archive.archive_year(conn, app.config['DATABASE'], app.config['ARCHIVE_DIR'], year)
+            click.echo(f"{year}: {', '.join(f'{table} {n}' for table, n in moved.items())}")
+    finally:
+        conn.close()
+
+@app.cli.command('classify-categories')
+@click.option('--all', 'everything', is_flag=True, help='Reclassify rows that already have a code.')
+def classify_categories_command(everything):
+    """Fill the category codes of research, participation and task rows from their labels."""
+    conn = get_db()
+    changed = categories.classify_rows(conn, reclassify=everything)
+    conn.commit()
+    click.echo(f'{changed} rows classified.')
 
 @app.route('/update/<int:id>', methods=['GET', 'POST'])
 @login_required
 def update(id):
     if session.get('role') == 'admin':
         if request.method == 'POST':
-            # Get form data
-            Scientific_research_Evaluation = request.form['Scientific_research_Evaluation']
-            supervision_Graduation_Evaluation = request.form['supervision_Graduation_Evaluation']
-
-            evaluation_fields = [
-            'Scientific_research_Evaluation',
-            'supervision_Graduation_Evaluation'
-             ]
-
-            # Calculate sum with error handling
-            try:
-                evaluation_sum = sum(int(request.form[field]) for field in evaluation_fields)
-            except ValueError as e:
-                # Handle case where a value can't be converted to int
-                evaluation_sum = 0  # or raise an exception
-                print(f"Error converting form values: {e}")
-
-        
-            # Insert into database
-            conn = sqlite3.connect(DATABASE)
-            cursor = conn.cursor()
-
-            update_query = " UPDATE Scientific_production SET Scientific_research_Evaluation == ?, supervision_Graduation_Evaluation == ?, evaluation_sum==? WHERE Scientific_production.user_id == ? "
-            cursor.execute(update_query, (Scientific_research_Evaluation,supervision_Graduation_Evaluation,evaluation_sum,id))
-            conn.commit()
-            conn.close()
-            flash('Data added successfully!', 'success')
+            # Same code path as the bulk grid, for a single user
+            result, = apply_evaluations(get_db(), 'Scientific_production', [dict(request.form.to_dict(), user_id=id)])
+            if result['status'] == 'updated':
+                flash('Data added successfully!', 'success')
+            else:
+                flash(result['error'], 'danger')
             return redirect(url_for('view_data'))
 
-        conn = get_db_connection()
+        conn = get_db()
 
         # Admin can see all data
         Scientific_production = conn.execute('''
@@ -723,7 +568,6 @@ def update(id):
             WHERE Scientific_production.user_id = ?
             ORDER BY Scientific_production.created_at DESC
         ''',(id,)).fetchone()
-        conn.close()
 
         return render_template('admin/update.html',id=id, Scientific_production=Scientific_production)
     else:
@@ -735,58 +579,15 @@ def update(id):
 def update_criteria(id):
     if session.get('role') == 'admin':
         if request.method == 'POST':
-            # Get form data 
-            Develop_courses_Evaluation = request.form['Develop_courses_Evaluation']
-            Prepare_file_Evaluation = request.form['Prepare_file_Evaluation']
-            Electronic_tests_Evaluation = request.form['Electronic_tests_Evaluation']
-            Prepare_material_Evaluation = request.form['Prepare_material_Evaluation']
-            Use_learning_Evaluation = request.form['Use_learning_Evaluation']
-            teaching_methods_Evaluation = request.form['teaching_methods_Evaluation']
-            Methods_student_Evaluation = request.form['Methods_student_Evaluation']
-            preparing_test_Evaluation = request.form['preparing_test_Evaluation']
-            Provide_academic_Evaluation = request.form['Provide_academic_Evaluation']
-
-            evaluation_fields = [
-            'Develop_courses_Evaluation',
-            'Prepare_file_Evaluation',
-            'Electronic_tests_Evaluation',
-            'Prepare_material_Evaluation',
-            'Use_learning_Evaluation',
-            'teaching_methods_Evaluation',
-            'Methods_student_Evaluation',
-            'preparing_test_Evaluation',
-            'Provide_academic_Evaluation'
-             ]
-
-            # Calculate sum with error handling
-            try:
-                evaluation_sum = sum(int(request.form[field]) for field in evaluation_fields)
-            except ValueError as e:
-                # Handle case where a value can't be converted to int
-                evaluation_sum = 0  # or raise an exception
-                print(f"Error converting form values: {e}")
-
-            # Insert into database
-            conn = sqlite3.connect(DATABASE)
-            cursor = conn.cursor()
-
-            update_query = ''' UPDATE Evaluation_aspects SET Develop_courses_Evaluation == ?,
-            Prepare_file_Evaluation == ?, Electronic_tests_Evaluation == ? ,
-            Prepare_material_Evaluation == ?, Use_learning_Evaluation == ?,
-            teaching_methods_Evaluation == ?, Methods_student_Evaluation == ?,
-            preparing_test_Evaluation == ?, Provide_academic_Evaluation == ? , evaluation_sum == ?
-            WHERE Evaluation_aspects.user_id == ? '''
-
-            cursor.execute(update_query, (Develop_courses_Evaluation,Prepare_file_Evaluation,
-            Electronic_tests_Evaluation,Prepare_material_Evaluation,
-            Use_learning_Evaluation,teaching_methods_Evaluation,
-            Methods_student_Evaluation,preparing_test_Evaluation,Provide_academic_Evaluation,evaluation_sum,id))
-            conn.commit()
-            conn.close()
-            flash('Data added successfully!', 'success')
+            # Same code path as the bulk grid, for a single user
+            result, = apply_evaluations(get_db(), 'criteria', [dict(request.form.to_dict(), user_id=id)])
+            if result['status'] == 'updated':
+                flash('Data added successfully!', 'success')
+            else:
+                flash(result['error'], 'danger')
             return redirect(url_for('view_data'))
 
-        conn = get_db_connection()
+        conn = get_db()
 
         # Admin can see all data
         Evaluation_aspects = conn.execute('''
@@ -796,213 +597,14 @@ def update_criteria(id):
             WHERE Evaluation_aspects.user_id = ?
             ORDER BY Evaluation_aspects.created_at DESC
         ''',(id,)).fetchone()
-        conn.close()
 
         return render_template('admin/criteria_of_evaluation.html',id=id, Evaluation_aspects=Evaluation_aspects)
     else:
         return render_template('page-404.html')
 
-
-@app.route('/add_Q', methods=['GET', 'POST'])
-def add_question():
-    if request.method == 'POST':
-        # Get form data
-        topic = request.form['topic'].strip()
-        main_slo = request.form['main_slo'].strip()
-        enabling_slos = request.form['enabling_slos'].strip()
-        complexity = request.form['complexity'].strip()
-        student_level = request.form['student_level'].strip()
-        question_text = request.form['question_text'].strip()
-        options = request.form['options'].strip()
-        correct_answer = request.form['correct_answer'].strip().upper()
-
-        # Validate inputs
-        if not all([topic, main_slo, complexity, student_level, question_text, options, correct_answer]):
-            flash('All fields are required!', 'error')
-            return render_template('add_question.html', form_data=request.form)
-
-        # Process options and validate correct answer
-        options_list = [opt.strip() for opt in options.split('\n') if opt.strip()]
-        if len(options_list) < 2:
-            flash('At least two options are required!', 'error')
-            return render_template('add_question.html', form_data=request.form)
-
-        valid_answers = [opt[0].upper() for opt in options_list if opt]
-        if correct_answer not in valid_answers:
-            flash('Correct answer must match one of the option letters!', 'error')
-            return render_template('add_question.html', form_data=request.form)
-
-        # Save to database
-        try:
-            conn = get_db_connection()
-            conn.execute('''
-                INSERT INTO questions (
-                    question_text, topic, main_slo, enabling_slos, 
-                    complexity_level, student_level, options, correct_answer
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                question_text, topic, main_slo, enabling_slos, 
-                complexity, student_level, options, correct_answer
-            ))
-            conn.commit()
-            conn.close()
-            
-            flash('Question added successfully!', 'success')
-            return redirect(url_for('add_question'))
-            
-        except Exception as e:
-            flash(f'Failed to add question: {str(e)}', 'error')
-    
-    return render_template('add_question.html')
-
-@app.route('/search', methods=['GET', 'POST'])
-def search_questions():
-    if request.method == 'POST':
-        search_term = request.form.get('search_term', '').strip()
-        complexity = request.form.get('complexity', '').strip()
-
-        conn = get_db_connection()
-        
-        query = '''
-            SELECT id, topic, main_slo, complexity_level, substr(question_text, 1, 100) as question_preview
-            FROM questions 
-            WHERE 1=1
-        '''
-        params = []
-        
-        if search_term:
-            query += " AND (question_text LIKE ? OR topic LIKE ? OR main_slo LIKE ?)"
-            params.extend([f"%{search_term}%"] * 3)
-        
-        if complexity:
-            query += " AND complexity_level = ?"
-            params.append(complexity)
-        
-        query += " ORDER BY id DESC"
-        
-        questions = conn.execute(query, params).fetchall()
-        conn.close()
-        
-        return render_template('search.html', questions=questions, search_term=search_term, complexity=complexity)
-    
-    return render_template('search.html')
-
-@app.route('/view_all')
-def view_all():
-    conn = get_db_connection()
-    questions = conn.execute('''
-        SELECT id, topic, main_slo, complexity_level, student_level, 
-               strftime('%Y-%m-%d', created_at) as created_at
-        FROM questions 
-        ORDER BY id DESC
-    ''').fetchall()
-    conn.close()
-    return render_template('view_all.html', questions=questions)
-
-@app.route('/question/<int:question_id>')
-def question_detail(question_id):
-    conn = get_db_connection()
-    question = conn.execute('''
-        SELECT *
-        FROM questions 
-        WHERE id = ?
-    ''', (question_id,)).fetchone()
-    conn.close()
-    
-    if question is None:
-        abort(404)
-    
-    return render_template('question_detail.html', question=question)
-
-@app.route('/edit/<int:question_id>', methods=['GET', 'POST'])
-def edit_question(question_id):
-    conn = get_db_connection()
-    
-    if request.method == 'POST':
-        # Get form data
-        topic = request.form['topic'].strip()
-        main_slo = request.form['main_slo'].strip()
-        enabling_slos = request.form['enabling_slos'].strip()
-        complexity = request.form['complexity'].strip()
-        student_level = request.form['student_level'].strip()
-        question_text = request.form['question_text'].strip()
-        options = request.form['options'].strip()
-        correct_answer = request.form['correct_answer'].strip().upper()
-
-        # Validate inputs
-        if not all([topic, main_slo, complexity, student_level, question_text, options, correct_answer]):
-            flash('All fields are required!', 'error')
-            conn.close()
-            return render_template('edit_question.html', question=request.form)
-
-        # Process options and validate correct answer
-        options_list = [opt.strip() for opt in options.split('\n') if opt.strip()]
-        if len(options_list) < 2:
-            flash('At least two options are required!', 'error')
-            conn.close()
-            return render_template('edit_question.html', question=request.form)
-
-        valid_answers = [opt[0].upper() for opt in options_list if opt]
-        if correct_answer not in valid_answers:
-            flash('Correct answer must match one of the option letters!', 'error')
-            conn.close()
-            return render_template('edit_question.html', question=request.form)
-
-        # Update database
-        try:
-            conn.execute('''
-                UPDATE questions SET
-                    question_text = ?,
-                    topic = ?,
-                    main_slo = ?,
-                    enabling_slos = ?,
-                    complexity_level = ?,
-                    student_level = ?,
-                    options = ?,
-                    correct_answer = ?
-                WHERE id = ?
-            ''', (
-                question_text, topic, main_slo, enabling_slos, 
-                complexity, student_level, options, correct_answer,
-                question_id
-            ))
-            conn.commit()
-            conn.close()
-            
-            flash('Question updated successfully!', 'success')
-            return redirect(url_for('question_detail', question_id=question_id))
-            
-        except Exception as e:
-            flash(f'Failed to update question: {str(e)}', 'error')
-            conn.close()
-    
-    # GET request - load existing question
-    question = conn.execute('''
-        SELECT *
-        FROM questions 
-        WHERE id = ?
-    ''', (question_id,)).fetchone()
-    conn.close()
-    
-    if question is None:
-        abort(404)
-    
-    return render_template('edit_question.html', question=question)
-
-@app.route('/delete/<int:question_id>', methods=['POST'])
-def delete_question(question_id):
-    conn = get_db_connection()
-    conn.execute('DELETE FROM questions WHERE id = ?', (question_id,))
-    conn.commit()
-    conn.close()
-    
-    flash('Question deleted successfully!', 'success')
-    return redirect(url_for('view_all'))
-
-
-
-
+with app.app_context():
+    init_db()
+write_behind.start(app)
 
 if __name__ == '__main__':
-    init_db()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,184 @@
+# Yearly archives of the per-user records that only ever grow.
+#
+# `flask archive-records` moves every row of ARCHIVED_TABLES entered in a
+# closed year (before the current one by default) out of the live tables
+# into a database file of its own for that year, next to the live one
+# (<database>.archive.<year>.db, in ARCHIVE_DIR if set). The pages, forms
+# and KPI triggers keep working on the live tables only, which stay the
+# size of the current year; the /kpis figures therefore cover the records
+# not yet archived.
+#
+# Historical reports read through history_source(), which ATTACHes the
+# archives a report needs to its connection and returns a UNION ALL of the
+# live table and those archives, aliased to the table's name so the
+# report's SQL does not change. SQLite attaches at most 10 databases to a
+# connection by default, so a report spans at most that many archived years.
+#
+# Rows are copied and committed to the archive first and only then deleted
+# from the live table, and only where the archive has them: an interrupted
+# run loses nothing and is simply run again.
+import datetime
+import glob
+import os
+import re
+import sqlite3
+
+from db import year_range
+
+DEFAULT_CONFIG = {
+    'ARCHIVE_DIR': None,                # the database's folder by default
+}
+
+# Tables whose rows are archived, all dated by created_at
+ARCHIVED_TABLES = [
+    'academic_data',
+    'activity_data',
+    'Scientific_research',
+    'participate_conference',
+]
+
+
+class ArchiveError(RuntimeError):
+    pass
+
+
+def _prefix(database):
+    return os.path.splitext(os.path.basename(database))[0] + '.archive.'
+
+
+def archive_path(database, directory, year):
+    directory = directory or os.path.dirname(os.path.abspath(database))
+    return os.path.join(directory, f'{_prefix(database)}{year}.db')
+
+
+def archived_years(database, directory):
+    directory = directory or os.path.dirname(os.path.abspath(database))
+    pattern = re.compile(re.escape(_prefix(database)) + r'(\d{4})\.db')
+    years = []
+    for path in glob.glob(os.path.join(glob.escape(directory), _prefix(database) + '*.db')):
+        match = pattern.fullmatch(os.path.basename(path))
+        if match:
+            years.append(int(match.group(1)))
+    return sorted(years)
+
+
+def _schema(year):
+    return f'archive_{year}'
+
+
+def _columns(conn, schema, table):
+    return [(row[1], row[2]) for row in conn.execute(f'PRAGMA {schema}.table_info("{table}")')]
+
+
+def _attach(conn, path, schema):
+    try:
+        conn.execute(f'ATTACH DATABASE ? AS {schema}', (path,))
+    except sqlite3.OperationalError as e:
+        if 'too many attached' in str(e):
+            raise ArchiveError('Too many archived years for one report; choose a year') from e
+        raise
+
+
+def attach_archives(conn, database, directory, years):
+    # ATTACH the archives of years that conn does not have yet
+    attached = {row[1] for row in conn.execute('PRAGMA database_list')}
+    for year in years:
+        if _schema(year) not in attached:
+            _attach(conn, archive_path(database, directory, year), _schema(year))
+
+
+def _prepare_table(conn, schema, table):
+    # Create the archive's copy of table, or add the columns the live table
+    # gained since the archive was written
+    live = _columns(conn, 'main', table)
+    existing = {name for name, _ in _columns(conn, schema, table)}
+    if not existing:
+        columns = ', '.join(f'"{name}" {type_}' + (' PRIMARY KEY' if name == 'id' else '')
+                            for name, type_ in live)
+        conn.execute(f'CREATE TABLE {schema}."{table}" ({columns})')
+    else:
+        for name, type_ in live:
+            if name not in existing:
+                conn.execute(f'ALTER TABLE {schema}."{table}" ADD COLUMN "{name}" {type_}')
+    # The same indexes as the live table, for per-user and per-date reports
+    conn.execute(f'''
+        CREATE INDEX IF NOT EXISTS {schema}.idx_{table}_user_created
+        ON "{table}" (user_id, created_at)
+    ''')
+    conn.execute(f'''
+        CREATE INDEX IF NOT EXISTS {schema}.idx_{table}_created
+        ON "{table}" (created_at)
+    ''')
+    return [name for name, _ in live]
+
+
+def closed_years(conn, before):
+    # Years before `before` that still have live rows
+    years = set()
+    for table in ARCHIVED_TABLES:
+        years.update(int(year) for (year,) in conn.execute(f'''
+            SELECT DISTINCT substr(created_at, 1, 4) FROM "{table}"
+            WHERE created_at < ?
+        ''', (f'{before}-01-01',)) if year and year.isdigit())
+    return sorted(years)
+
+
+def archive_year(conn, database, directory, year):
+    # Move the rows of `year` into its archive; returns {table: rows moved}.
+    # conn must be a plain read-write connection with no open transaction.
+    if year >= datetime.date.today().year:
+        raise ArchiveError(f'{year} is not a closed year')
+    schema = _schema(year)
+    start, end = year_range(year)
+    _attach(conn, archive_path(database, directory, year), schema)
+    try:
+        with conn:
+            for table in ARCHIVED_TABLES:
+                columns = ', '.join(f'"{name}"' for name in _prepare_table(conn, schema, table))
+                # Rows copied by an interrupted run are simply copied again
+                conn.execute(f'''
+                    INSERT OR REPLACE INTO {schema}."{table}" ({columns})
+                    SELECT {columns} FROM main."{table}"
+                    WHERE created_at >= ? AND created_at < ?
+                ''', (start, end))
+
+        moved = {}
+        with conn:
+            for table in ARCHIVED_TABLES:
+                moved[table] = conn.execute(f'''
+                    DELETE FROM main."{table}"
+                    WHERE created_at >= ? AND created_at < ?
+                    AND id IN (SELECT id FROM {schema}."{table}")
+                ''', (start, end)).rowcount
+        return moved
+    finally:
+        conn.execute(f'DETACH DATABASE {schema}')
+
+
+def history_source(conn, database, directory, table, years=None):
+    # FROM clause over the live rows of table and its archived ones, from
+    # the archives of `years` (all of them by default)
+    if table not in ARCHIVED_TABLES:
+        return f'"{table}"'
+    available = archived_years(database, directory)
+    if years is not None:
+        available = [year for year in available if year in years]
+
+    live = [name for name, _ in _columns(conn, 'main', table)]
+    selects = [f'''SELECT {', '.join(f'"{name}"' for name in live)} FROM main."{table}"''']
+    attach_archives(conn, database, directory, available)
+    for year in available:
+        schema = _schema(year)
+        present = {name for name, _ in _columns(conn, schema, table)}
+        if not present:
+            continue
+        # Columns added to the live table after the year was archived
+        values = ', '.join(f'"{name}"' if name in present else f'NULL AS "{name}"' for name in live)
+        selects.append(f'SELECT {values} FROM {schema}."{table}"')
+    union = '\nUNION ALL\n'.join(selects)
+    return f'({union}) AS "{table}"'
+
+
+def init_app(app):
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
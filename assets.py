@@ -0,0 +1,148 @@
+# Fingerprinted, precompressed static assets.
+#
+# `flask build-assets` bundles and minifies the stylesheets the layouts
+# link to (BUNDLES), writes each bundle under static/dist with a hash of
+# its content in the name, plus .gz (and .br when the brotli package is
+# installed) copies compressed once at build time, and records the names
+# in static/dist/manifest.json. Templates link through asset_url(), which
+# resolves a bundle to its fingerprinted URL; those URLs are served with
+# the precompressed copy the browser accepts and a one-year immutable
+# Cache-Control, so a repeat visit fetches no stylesheet at all, and a
+# changed stylesheet gets a new name instead of a stale cached copy.
+# Without a build, asset_url() falls back to the plain static files.
+import gzip
+import hashlib
+import json
+import os
+import re
+
+from flask import abort, current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always built
+    brotli = None
+
+DEFAULT_CONFIG = {
+    'ASSETS_FOLDER': 'dist',            # under the static folder
+    'ASSETS_MAX_AGE': 365 * 24 * 3600,  # seconds
+}
+
+# bundle name -> source files in the static folder, in cascade order
+BUNDLES = {
+    'styles.css': ['styles.css'],       # base.html, base_full.html
+    'style.css': ['style.css'],         # base1.html (question bank)
+}
+
+MIMETYPES = {'.css': 'text/css'}
+
+_manifest = {}
+
+
+def minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    # Spaces before ':' are kept, "a :hover" is not "a:hover"
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip()
+
+
+def output_folder(app):
+    return os.path.join(app.static_folder, app.config['ASSETS_FOLDER'])
+
+
+def manifest_path(app):
+    return os.path.join(output_folder(app), 'manifest.json')
+
+
+def _read_manifest(app):
+    try:
+        with open(manifest_path(app), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def build_assets(app):
+    # Returns the new manifest. Files of the previous build are kept, so
+    # pages rendered before the deploy still find their stylesheets; older
+    # ones are removed.
+    folder = output_folder(app)
+    os.makedirs(folder, exist_ok=True)
+    previous = _read_manifest(app)
+
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        text = '\n'.join(_read(os.path.join(app.static_folder, source)) for source in sources)
+        data = minify_css(text).encode('utf-8')
+        stem, extension = os.path.splitext(name)
+        hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+        _write(os.path.join(folder, hashed), data)
+        # mtime=0 keeps the .gz identical from one build to the next
+        _write(os.path.join(folder, hashed + '.gz'), gzip.compress(data, 9, mtime=0))
+        if brotli is not None:
+            _write(os.path.join(folder, hashed + '.br'), brotli.compress(data))
+        manifest[name] = hashed
+
+    keep = set(manifest.values()) | set(previous.values())
+    for filename in os.listdir(folder):
+        base = re.sub(r'\.(gz|br)$', '', filename)
+        if filename != 'manifest.json' and base not in keep:
+            os.remove(os.path.join(folder, filename))
+
+    with open(manifest_path(app), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    _manifest.clear()
+    _manifest.update(manifest)
+    return manifest
+
+
+def asset_url(filename):
+    hashed = _manifest.get(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('asset', filename=hashed)
+
+
+def serve_asset(filename):
+    folder = output_folder(current_app)
+    # Only fingerprinted names may be cached as immutable
+    if not re.fullmatch(r'[\w-]+\.[0-9a-f]{12}\.\w+', filename) or not os.path.isfile(os.path.join(folder, filename)):
+        abort(404)
+
+    encodings = request.accept_encodings
+    served, encoding = filename, None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encodings[candidate] and os.path.isfile(os.path.join(folder, filename + suffix)):
+            served, encoding = filename + suffix, candidate
+            break
+
+    mimetype = MIMETYPES.get(os.path.splitext(filename)[1])
+    response = send_from_directory(folder, served, mimetype=mimetype,
+                                   max_age=current_app.config['ASSETS_MAX_AGE'])
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+    _manifest.clear()
+    _manifest.update(_read_manifest(app))
+    app.add_url_rule(f"{app.static_url_path}/{app.config['ASSETS_FOLDER']}/<path:filename>", 'asset', serve_asset)
+    app.add_template_global(asset_url)
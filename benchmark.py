@@ -0,0 +1,295 @@
+# Load test for the main user journeys.
+#
+# Seeds a synthetic academic.db at the requested scale, serves the real
+# app on a local threaded WSGI server and drives it with concurrent
+# clients through login, form submission, /view, /kpis and question
+# search. Latency percentiles and throughput per step are printed
+# (and optionally written) as JSON, tagged with the current commit, so runs
+# can be compared across commits:
+#
+#     python benchmark.py --users 200 --semesters 10 --clients 8 --iterations 20 -o before.json
+#     python benchmark.py ... -o after.json --baseline before.json
+import argparse
+import http.cookiejar
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import make_server
+
+from forms import FORMS, insert_records
+from migrations import migrate, ACADEMIC_MIGRATIONS
+from papers import COMPLEXITY_LEVELS, STUDENT_LEVELS
+
+PASSWORD = 'bench'
+WORDS = ['الجودة', 'التقويم', 'الطلاب', 'المقرر', 'التعلم', 'البحث', 'الاختبار', 'المعايير',
+         'biology', 'cell', 'energy', 'protein', 'enzyme', 'system', 'analysis', 'design']
+
+# Realistic values for the columns the KPIs and reports look at; any other
+# column gets random words, numbers or dates by its form type
+SAMPLE_VALUES = {
+    'semester': ['الأول', 'الثاني', 'الصيفي'],
+    'semester_type': ['نظري', 'عملي'],
+    'research_type': ['بحث منشور', 'بحث مقبول', 'بحث قيد التحكيم'],
+    'Publisher': ['مجلة علمية محكمة', 'مؤتمر دولي', 'مؤتمر محلي'],
+    'participation_type': ['حضور', 'مقدم', 'منظم'],
+}
+
+
+def _value(rng, column, kind):
+    if column in SAMPLE_VALUES:
+        return rng.choice(SAMPLE_VALUES[column])
+    if kind == 'int':
+        return rng.randint(0, 5)
+    if kind == 'date':
+        return f'{rng.randint(2019, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}'
+    return ' '.join(rng.choices(WORDS, k=3))
+
+
+def _question(rng):
+    return (
+        ' '.join(rng.choices(WORDS, k=12)) + '؟',
+        rng.choice(WORDS),
+        'SLO ' + str(rng.randint(1, 20)),
+        'SLO ' + str(rng.randint(1, 20)),
+        rng.choice(COMPLEXITY_LEVELS),
+        rng.choice(STUDENT_LEVELS),
+        '\n'.join(f'{letter}) {rng.choice(WORDS)}' for letter in 'ABCD'),
+        rng.choice('ABCD'),
+    )
+
+
+def _insert_questions(conn, rng, count):
+    conn.executemany('''
+        INSERT INTO questions (question_text, topic, main_slo, enabling_slos,
+                               complexity_level, student_level, options, correct_answer)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [_question(rng) for _ in range(count)])
+
+
+def seed(directory, scale, seed=0):
+    # Builds academic.db, question bank included, in directory and returns its path
+    rng = random.Random(seed)
+    academic = os.path.join(directory, 'academic.db')
+
+    conn = sqlite3.connect(academic)
+    migrate(conn, ACADEMIC_MIGRATIONS)
+    # Hashing is deliberately slow; every synthetic user shares one hash
+    password = generate_password_hash(PASSWORD)
+    with conn:
+        conn.executemany(
+            'INSERT INTO users (username, password, full_name, department) VALUES (?, ?, ?, ?)',
+            [(f'bench{i}', password, f'Member {i}', rng.choice(['CS', 'IT', 'IS']))
+             for i in range(scale['users'])],
+        )
+        user_ids = [row[0] for row in conn.execute("SELECT id FROM users WHERE role != 'admin'")]
+        for name, per_user in (('semester', scale['semesters']), ('activity', scale['activities']),
+                               ('research', scale['research'])):
+            schema = FORMS[name]
+            # Through the form validator, so derived columns are filled in
+            insert_records(conn, schema, [
+                (user_id,) + schema['validate']({
+                    column: str(_value(rng, column, kind)) for column, _, kind, _ in schema['fields']})
+                for user_id in user_ids for _ in range(per_user)
+            ])
+        _insert_questions(conn, rng, scale['questions'])
+    conn.close()
+    return academic
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Each step is timed on its own response, not on the page it redirects to
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Client:
+    def __init__(self, base_url, samples, lock):
+        self.base_url = base_url
+        self.samples = samples
+        self.lock = lock
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect)
+
+    def request(self, step, path, form=None, redirect_to=None):
+        # With redirect_to, only a redirect there counts as a success: a
+        # failed login answers 200 with the login page again
+        data = urllib.parse.urlencode(form).encode() if form is not None else None
+        start = time.perf_counter()
+        try:
+            with self.opener.open(self.base_url + path, data=data, timeout=60) as response:
+                response.read()
+                ok = response.status < 400 and redirect_to is None
+        except urllib.error.HTTPError as e:
+            e.read()
+            # Redirects surface as errors once redirect handling is off
+            if redirect_to is None:
+                ok = e.code < 400
+            else:
+                location = urllib.parse.urlsplit(e.headers.get('Location', '')).path
+                ok = e.code == 302 and location == redirect_to
+        except OSError:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.samples.setdefault(step, []).append((elapsed, ok))
+
+
+def _journey(client, admin, rng, username):
+    client.request('login', '/login', {'username': username, 'password': PASSWORD}, redirect_to='/view')
+    client.request('submit_semester', FORMS['semester']['rule'], {
+        column: _value(rng, column, kind) for column, _, kind, _ in FORMS['semester']['fields']
+    })
+    client.request('view', '/view')
+    admin.request('kpis', '/kpis')
+    client.request('search', '/search', {
+        'search_term': ' '.join(rng.choices(WORDS, k=2)),
+        'complexity': rng.choice([''] + COMPLEXITY_LEVELS),
+    })
+
+
+def _percentile(ordered, percent):
+    # Nearest-rank percentile of an already sorted list
+    index = max(0, min(len(ordered) - 1, math.ceil(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples, elapsed):
+    def stats(values):
+        durations = sorted(duration for duration, _ in values)
+        return {
+            'requests': len(values),
+            'errors': sum(1 for _, ok in values if not ok),
+            'rps': round(len(values) / elapsed, 2),
+            'mean_ms': round(sum(durations) / len(durations) * 1000, 2),
+            'p50_ms': round(_percentile(durations, 50) * 1000, 2),
+            'p95_ms': round(_percentile(durations, 95) * 1000, 2),
+            'p99_ms': round(_percentile(durations, 99) * 1000, 2),
+        }
+
+    every = [sample for values in samples.values() for sample in values]
+    return {
+        'overall': stats(every) if every else {},
+        'steps': {step: stats(values) for step, values in sorted(samples.items())},
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(scale, clients, iterations, seed_value=0, directory=None):
+    directory = directory or tempfile.mkdtemp(prefix='form_app_bench_')
+    academic = seed(directory, scale, seed_value)
+
+    # app.py reads its database from the environment and migrates on import
+    os.environ['FLASK_DATABASE'] = academic
+    import app as application
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    server = make_server('127.0.0.1', 0, application.app, threaded=True)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    samples, lock = {}, threading.Lock()
+
+    def worker(index):
+        rng = random.Random(seed_value * 1000 + index)
+        client = Client(base_url, samples, lock)
+        admin = Client(base_url, samples, lock)
+        admin.request('login', '/login', {'username': 'admin', 'password': 'admin123'}, redirect_to='/view')
+        for _ in range(iterations):
+            _journey(client, admin, rng, f'bench{index % scale["users"]}')
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    report = {
+        'commit': _commit(),
+        'scale': scale,
+        'clients': clients,
+        'iterations': iterations,
+        'seconds': round(elapsed, 3),
+    }
+    report.update(summarize(samples, elapsed))
+    return report, directory
+
+
+def compare(report, baseline):
+    # Relative change of p95 and throughput per step against an earlier run
+    changes = {}
+    for step, stats in report['steps'].items():
+        before = baseline.get('steps', {}).get(step)
+        if not before:
+            continue
+        changes[step] = {
+            key: round((stats[key] - before[key]) / before[key] * 100, 1) if before[key] else None
+            for key in ('p95_ms', 'rps')
+        }
+    return {'commit': baseline.get('commit'), 'change_percent': changes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the form app.')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--semesters', type=int, default=10, help='rows per user')
+    parser.add_argument('--activities', type=int, default=5, help='rows per user')
+    parser.add_argument('--research', type=int, default=3, help='rows per user')
+    parser.add_argument('--questions', type=int, default=2000)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--iterations', type=int, default=20, help='journeys per client')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dir', help='where to build the databases (default: a temporary directory)')
+    parser.add_argument('--keep', action='store_true', help='keep the generated databases')
+    parser.add_argument('-o', '--output', help='write the JSON report to this file')
+    parser.add_argument('--baseline', help='JSON report of an earlier run to compare against')
+    args = parser.parse_args()
+
+    if args.dir:
+        os.makedirs(args.dir, exist_ok=True)
+    scale = {
+        'users': args.users,
+        'semesters': args.semesters,
+        'activities': args.activities,
+        'research': args.research,
+        'questions': args.questions,
+    }
+    report, directory = run(scale, args.clients, args.iterations, args.seed, args.dir)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            report['baseline'] = compare(report, json.load(f))
+    if not (args.keep or args.dir):
+        shutil.rmtree(directory, ignore_errors=True)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
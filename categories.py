@@ -0,0 +1,142 @@
+# Coded categorical columns.
+#
+# Research type, publisher kind, participation type and task level are
+# typed or picked as Arabic labels, with every spelling variant that
+# implies. Each such column gets an integer twin (<column>_code) holding
+# the code of its category from a small lookup table, so reports filter on
+# indexed integer equality instead of LIKE '%...%' over the labels. Forms
+# and imports fill the code when the row is written (see forms.py);
+# classify_rows() backfills rows written before, or after new keywords
+# are added. A label matching no keyword keeps a NULL code. The labels
+# themselves are stored unchanged for display.
+from db import table_columns
+from question_search import normalize_arabic
+
+# Codes are stored in the data: never renumber, only append
+RESEARCH_PUBLISHED = 1
+RESEARCH_ACCEPTED = 2
+RESEARCH_UNDER_REVIEW = 3
+RESEARCH_BOOK = 4
+RESEARCH_INVENTION = 5
+RESEARCH_INNOVATION = 6
+
+PUBLISHER_JOURNAL = 1
+PUBLISHER_CONFERENCE = 2
+PUBLISHER_INVENTION = 3
+PUBLISHER_INNOVATION = 4
+
+# name -> lookup table and (code, label, keywords); the first entry with a
+# keyword in the label wins
+CATEGORIES = {
+    'research_type': {
+        'table': 'research_types',
+        'values': [
+            (RESEARCH_PUBLISHED, 'بحث منشور', ['منشور']),
+            (RESEARCH_ACCEPTED, 'بحث مقبول', ['مقبول']),
+            (RESEARCH_UNDER_REVIEW, 'بحث قيد التحكيم', ['تحكيم']),
+            (RESEARCH_BOOK, 'كتاب', ['كتاب']),
+            (RESEARCH_INVENTION, 'اختراع', ['اختراع']),
+            (RESEARCH_INNOVATION, 'ابتكار', ['ابتكار']),
+        ],
+    },
+    'publisher': {
+        'table': 'publisher_kinds',
+        'values': [
+            (PUBLISHER_JOURNAL, 'مجلة علمية', ['مجلة', 'دورية']),
+            (PUBLISHER_CONFERENCE, 'مؤتمرات و ندوات', ['مؤتمر', 'ندوة', 'ندوات']),
+            (PUBLISHER_INVENTION, 'اختراع', ['اختراع']),
+            (PUBLISHER_INNOVATION, 'ابتكار', ['ابتكار']),
+        ],
+    },
+    'participation_type': {
+        'table': 'participation_types',
+        'values': [
+            (1, 'حضور', ['حضور', 'حاضر']),
+            (2, 'بحث', ['بحث']),
+            (3, 'ورقة عمل', ['ورقة عمل']),
+            (4, 'رئاسة جلسة', ['رئاسة', 'رئيس']),
+            (5, 'عضو منظم', ['منظم', 'تنظيم']),
+            (6, 'مقدم', ['مقدم', 'محاضر', 'تقديم']),
+        ],
+    },
+    'task_level': {
+        'table': 'task_levels',
+        'values': [
+            (4, 'بنك المسؤولية المجتمعية', ['مجتمع']),
+            (1, 'القسم', ['قسم']),
+            (2, 'الكلية', ['كلية']),
+            (3, 'الجامعة', ['جامعة']),
+        ],
+    },
+}
+
+# (table, label column, category) for every coded column; the code lives
+# in <label column>_code
+CODED_COLUMNS = [
+    ('Scientific_research', 'research_type', 'research_type'),
+    ('Scientific_research', 'Publisher', 'publisher'),
+    ('participate_conference', 'type_part', 'participation_type'),
+    ('activity_data', 'participation_type', 'participation_type'),
+    ('University_Service', 'task_level', 'task_level'),
+]
+
+_keywords = {
+    name: [(code, [normalize_arabic(keyword) for keyword in keywords])
+           for code, _, keywords in category['values']]
+    for name, category in CATEGORIES.items()
+}
+
+
+def classify(category, label):
+    # The code of label in category, or None
+    text = ' '.join(normalize_arabic(label).split())
+    if not text:
+        return None
+    for code, keywords in _keywords[category]:
+        if any(keyword in text for keyword in keywords):
+            return code
+    return None
+
+
+def code_column(column):
+    return f'{column}_code'
+
+
+def create_tables(conn):
+    for category in CATEGORIES.values():
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {category['table']} (
+                code INTEGER PRIMARY KEY,
+                label TEXT NOT NULL
+            )
+        ''')
+        conn.executemany(f'INSERT OR REPLACE INTO {category["table"]} (code, label) VALUES (?, ?)',
+                         [(code, label) for code, label, _ in category['values']])
+    for table, column, category in CODED_COLUMNS:
+        if code_column(column) not in table_columns(conn, table):
+            conn.execute(f'''
+                ALTER TABLE "{table}" ADD COLUMN {code_column(column)} INTEGER
+                REFERENCES {CATEGORIES[category]['table']} (code)
+            ''')
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table}_{code_column(column)}
+            ON "{table}" ({code_column(column)})
+        ''')
+
+
+def classify_rows(conn, reclassify=False):
+    # Fill the codes from the labels, one UPDATE per distinct label; with
+    # reclassify every row is looked at again, not just uncoded ones.
+    # Returns the number of rows whose code changed.
+    changed = 0
+    for table, column, category in CODED_COLUMNS:
+        code = code_column(column)
+        where = f'{column} IS NOT NULL' + ('' if reclassify else f' AND {code} IS NULL')
+        labels = [label for (label,) in conn.execute(f'SELECT DISTINCT {column} FROM "{table}" WHERE {where}')]
+        for label in labels:
+            value = classify(category, label)
+            changed += conn.execute(f'''
+                UPDATE "{table}" SET {code} = ?
+                WHERE {column} = ? AND {code} IS NOT ?
+            ''', (value, label, value)).rowcount
+    return changed
@@ -0,0 +1,96 @@
+import sqlite3
+import threading
+from flask import current_app, g
+
+# Per-thread connection pool. Each worker thread keeps one open connection
+# per database file and hands it out to every request it serves; the app
+# context only borrows it, so nothing is opened or closed per request.
+_pool = threading.local()
+
+DEFAULT_CONFIG = {
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_CACHE_SIZE': -16000,        # negative = KiB, so ~16 MB per connection
+    'SQLITE_MMAP_SIZE': 128 * 1024 * 1024,
+    'SQLITE_BUSY_TIMEOUT': 5000,        # milliseconds
+    'SQLITE_CONNECTION_FACTORY': sqlite3.Connection,
+    # None: every connection writes for itself. Otherwise writes go through
+    # one writer, 'local' or the Unix socket of db_writer.py (see there)
+    'SQLITE_WRITER': None,
+}
+
+
+def init_app(app):
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+    app.teardown_appcontext(release_db)
+
+
+def _connect(database, config, readonly=False, **kwargs):
+    conn = sqlite3.connect(
+        database,
+        timeout=config['SQLITE_BUSY_TIMEOUT'] / 1000,
+        factory=config['SQLITE_CONNECTION_FACTORY'],
+        **kwargs,
+    )
+    conn.row_factory = sqlite3.Row
+    if not readonly:
+        # Both are settings of the database file, which a reader cannot change
+        conn.execute(f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+        conn.execute(f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}")
+    conn.execute(f"PRAGMA cache_size = {int(config['SQLITE_CACHE_SIZE'])}")
+    conn.execute(f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}")
+    conn.execute(f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT'])}")
+    return conn
+
+
+def connect(database, config):
+    # A connection of our own, routed through the writer if there is one
+    if config['SQLITE_WRITER']:
+        import db_writer
+        return db_writer.connect(database, config)
+    return _connect(database, config)
+
+
+def table_columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+
+
+def year_range(year):
+    # The created_at bounds of a calendar year; comparing against a range
+    # rather than strftime() keeps the created_at indexes usable
+    return f'{year}-01-01', f'{year + 1}-01-01'
+
+
+# Borrow this thread's connection to ``database`` (the app's DATABASE by
+# default) for the rest of the app context.
+def get_db(database=None):
+    database = database or current_app.config['DATABASE']
+    borrowed = g.setdefault('_db_borrowed', {})
+    if database in borrowed:
+        return borrowed[database]
+
+    connections = getattr(_pool, 'connections', None)
+    if connections is None:
+        connections = _pool.connections = {}
+    conn = connections.get(database)
+    if conn is None:
+        conn = connections[database] = connect(database, current_app.config)
+    borrowed[database] = conn
+    return conn
+
+
+def release_db(exc=None):
+    # Hand the connections back to the pool. Anything a failed request left
+    # uncommitted is rolled back so the next request starts clean.
+    borrowed = g.pop('_db_borrowed', {})
+    for conn in borrowed.values():
+        if conn.in_transaction:
+            conn.rollback()
+
+
+def close_pool():
+    connections = getattr(_pool, 'connections', {})
+    while connections:
+        _, conn = connections.popitem()
+        conn.close()
@@ -0,0 +1,348 @@
+# Single-writer database access.
+#
+# With SQLITE_WRITER set, get_db() hands out a RoutedConnection instead of
+# a plain sqlite3 connection. Reads run on a per-thread connection opened
+# read-only (mode=ro), so they scale with the number of workers and never
+# take a lock. Every statement that writes, and everything after it until
+# commit or rollback, is sent to one writer that owns the only read-write
+# connection and runs one transaction at a time; other workers queue for
+# it in the writer instead of retrying SQLite's write lock.
+#
+# SQLITE_WRITER is either the path of the Unix socket a writer process
+# listens on, started with
+#
+#     python db_writer.py --database academic.db --socket /run/academic/writer.sock
+#
+# or 'local' for an in-process stand-in with the same behaviour, for tests
+# and single-process servers. Either writer creates the database if need
+# be and applies the migrations before any reader opens it. A transaction
+# left idle for longer than the idle timeout is rolled back so a stuck
+# worker cannot hold the writer forever.
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from urllib.parse import quote
+
+import db
+
+IDLE_TIMEOUT = 30                       # seconds
+
+# Leading keyword of statements that only read, and of statements that
+# always write; anything else (WITH, PRAGMA, ATTACH...) is tried on the
+# read-only connection first
+_READ = re.compile(r'\s*(SELECT|EXPLAIN|VALUES)\b', re.IGNORECASE)
+_WRITE = re.compile(r'\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER|BEGIN|SAVEPOINT|RELEASE|VACUUM|REINDEX)\b',
+                    re.IGNORECASE)
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+class _Client:
+    def __init__(self):
+        self.aborted = False
+
+
+class WriterService:
+    # Runs the statements of one client transaction at a time on the only
+    # read-write connection
+    def __init__(self, conn, busy_timeout, idle_timeout=IDLE_TIMEOUT):
+        self.conn = conn
+        self.busy_timeout = busy_timeout
+        self.idle_timeout = idle_timeout
+        self._cond = threading.Condition()
+        self._holder = None
+        self._executing = False
+        self._last_used = 0
+
+    def _acquire(self, client):
+        deadline = time.monotonic() + self.busy_timeout
+        with self._cond:
+            while self._holder not in (None, client):
+                if not self._executing and time.monotonic() - self._last_used > self.idle_timeout:
+                    self.conn.rollback()
+                    self._holder.aborted = True
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise sqlite3.OperationalError('database is locked')
+                self._cond.wait(min(remaining, self.idle_timeout))
+            self._holder = client
+            self._executing = True
+
+    def _release(self):
+        self._holder = None
+        self._cond.notify_all()
+
+    def dispatch(self, client, op, args):
+        try:
+            return self._dispatch(client, op, args)
+        except sqlite3.Error as e:
+            # Whether the client's transaction survived the error
+            e.in_transaction = self._holder is client
+            raise
+
+    def _dispatch(self, client, op, args):
+        if client.aborted:
+            client.aborted = False
+            raise sqlite3.OperationalError('transaction rolled back by the writer after being idle')
+
+        if op in ('commit', 'rollback'):
+            with self._cond:
+                if self._holder is client:
+                    try:
+                        getattr(self.conn, op)()
+                    finally:
+                        self._release()
+            return {'in_transaction': False}
+
+        self._acquire(client)
+        try:
+            if op == 'execute':
+                cursor = self.conn.execute(*args)
+            elif op == 'executemany':
+                cursor = self.conn.executemany(*args)
+            elif op == 'executescript':
+                cursor = self.conn.executescript(*args)
+            else:
+                raise sqlite3.ProgrammingError(f'unknown writer operation {op!r}')
+            return {
+                'columns': [column[0] for column in cursor.description] if cursor.description else None,
+                'rows': [tuple(row) for row in cursor.fetchall()],
+                'lastrowid': cursor.lastrowid,
+                'rowcount': cursor.rowcount,
+                'in_transaction': self.conn.in_transaction,
+            }
+        finally:
+            with self._cond:
+                self._executing = False
+                self._last_used = time.monotonic()
+                # Nothing left open (a read, or DDL in autocommit): let the
+                # next client in
+                if not self.conn.in_transaction:
+                    self._release()
+
+    def disconnect(self, client):
+        with self._cond:
+            if self._holder is client:
+                self.conn.rollback()
+                self._release()
+
+
+class _LocalChannel:
+    def __init__(self, service):
+        self.service = service
+        self.client = _Client()
+
+    def call(self, op, *args):
+        return self.service.dispatch(self.client, op, args)
+
+    def close(self):
+        self.service.disconnect(self.client)
+
+
+def _unavailable(cause):
+    # The writer rolls back the transaction of a client it loses
+    error = sqlite3.OperationalError(f'database writer unavailable: {cause}')
+    error.in_transaction = False
+    return error
+
+
+class _SocketChannel:
+    def __init__(self, path):
+        try:
+            self.conn = Client(path, family='AF_UNIX')
+        except OSError as e:
+            raise _unavailable(e)
+
+    def call(self, op, *args):
+        try:
+            self.conn.send((op, args))
+            reply = self.conn.recv()
+        except (OSError, EOFError) as e:
+            raise _unavailable(e)
+        if reply[0] == 'error':
+            error = getattr(sqlite3, reply[1], sqlite3.OperationalError)(reply[2])
+            error.in_transaction = reply[3]
+            raise error
+        return reply[1]
+
+    def close(self):
+        self.conn.close()
+
+
+class _Row(tuple):
+    # What sqlite3.Row offers the app: access by position or column name
+    def __new__(cls, values, columns, index):
+        row = super().__new__(cls, values)
+        row._columns = columns
+        row._index = index
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key.lower()])
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return list(self._columns)
+
+
+class _RemoteCursor:
+    def __init__(self, result):
+        self.lastrowid = result['lastrowid']
+        self.rowcount = result['rowcount']
+        columns = result['columns'] or []
+        self.description = tuple((name,) + (None,) * 6 for name in columns) or None
+        index = {name.lower(): i for i, name in enumerate(columns)}
+        self._rows = iter([_Row(row, columns, index) for row in result['rows']])
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size=1):
+        return [row for _, row in zip(range(size), self._rows)]
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def __iter__(self):
+        return self._rows
+
+
+class RoutedConnection:
+    def __init__(self, reader, channel):
+        self.reader = reader
+        self.channel = channel
+        self.in_transaction = False     # on the writer
+
+    def _remote(self, op, *args):
+        try:
+            result = self.channel.call(op, *args)
+        except sqlite3.Error as e:
+            self.in_transaction = getattr(e, 'in_transaction', False)
+            raise
+        self.in_transaction = result['in_transaction']
+        return result
+
+    def execute(self, sql, parameters=()):
+        # Inside a write transaction everything goes to the writer, which
+        # alone sees the uncommitted changes
+        if not self.in_transaction and not _WRITE.match(sql):
+            try:
+                return self.reader.execute(sql, parameters)
+            except sqlite3.OperationalError as e:
+                if _READ.match(sql) or 'readonly' not in str(e):
+                    raise
+        return _RemoteCursor(self._remote('execute', sql, parameters))
+
+    def executemany(self, sql, seq_of_parameters):
+        return _RemoteCursor(self._remote('executemany', sql, list(seq_of_parameters)))
+
+    def executescript(self, script):
+        return _RemoteCursor(self._remote('executescript', script))
+
+    def commit(self):
+        if self.in_transaction:
+            self._remote('commit')
+
+    def rollback(self):
+        if self.in_transaction:
+            self._remote('rollback')
+
+    def close(self):
+        self.rollback()
+        self.channel.close()
+        self.reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+
+def _writer_connection(database, config):
+    # Creates the database if need be and brings its schema up to date,
+    # before any read-only connection tries to open it
+    from migrations import ACADEMIC_MIGRATIONS, migrate
+
+    conn = db._connect(database, config, check_same_thread=False)
+    migrate(conn, ACADEMIC_MIGRATIONS)
+    return conn
+
+
+def _local_service(database, config):
+    with _services_lock:
+        service = _services.get(database)
+        if service is None:
+            conn = _writer_connection(database, config)
+            service = _services[database] = WriterService(conn, config['SQLITE_BUSY_TIMEOUT'] / 1000)
+        return service
+
+
+def connect(database, config):
+    # The writer first: in local mode it is what creates a new database
+    if config['SQLITE_WRITER'] == 'local':
+        channel = _LocalChannel(_local_service(database, config))
+    else:
+        channel = _SocketChannel(config['SQLITE_WRITER'])
+    reader = db._connect(f'file:{quote(os.path.abspath(database))}?mode=ro', config, readonly=True, uri=True)
+    return RoutedConnection(reader, channel)
+
+
+def _serve_client(service, conn):
+    client = _Client()
+    try:
+        while True:
+            try:
+                op, args = conn.recv()
+            except (EOFError, OSError):
+                break
+            try:
+                reply = ('ok', service.dispatch(client, op, args))
+            except sqlite3.Error as e:
+                reply = ('error', type(e).__name__, str(e), e.in_transaction)
+            conn.send(reply)
+    finally:
+        service.disconnect(client)
+        conn.close()
+
+
+def serve(database, socket_path, config, idle_timeout=IDLE_TIMEOUT):
+    conn = _writer_connection(database, config)
+    service = WriterService(conn, config['SQLITE_BUSY_TIMEOUT'] / 1000, idle_timeout)
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    listener = Listener(socket_path, family='AF_UNIX')
+    # Only the server's user and group may write to the database
+    os.chmod(socket_path, 0o660)
+    try:
+        while True:
+            client = listener.accept()
+            threading.Thread(target=_serve_client, args=(service, client), daemon=True).start()
+    finally:
+        listener.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve every write to an SQLite database over a Unix socket.')
+    parser.add_argument('--database', default='academic.db')
+    parser.add_argument('--socket', required=True, help='path of the Unix socket to listen on')
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                        help='seconds before an idle transaction is rolled back')
+    args = parser.parse_args()
+    serve(args.database, args.socket, dict(db.DEFAULT_CONFIG), args.idle_timeout)
+
+
+if __name__ == '__main__':
+    main()
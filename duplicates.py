@@ -0,0 +1,191 @@
+# Near-duplicate question detection (MinHash + LSH).
+#
+# Each question's normalized text is cut into overlapping character
+# shingles and summarised by a MinHash signature of NUM_HASHES values; the
+# share of equal values between two signatures estimates the Jaccard
+# similarity of their shingle sets. The signature is split into BANDS
+# bands whose hashes are stored in question_lsh, so questions sharing any
+# band bucket are the only candidates compared: a lookup touches a few
+# index entries instead of every question in the bank. The tables are
+# kept current by index_question() on add/edit and by a delete trigger.
+import hashlib
+import operator
+import struct
+from array import array
+
+from question_search import normalize_arabic
+
+NUM_HASHES = 64
+# BANDS * ROWS == NUM_HASHES. A pair of similarity s shares some band with
+# probability 1 - (1 - s**ROWS)**BANDS: about 64% at s = 0.5 and 99% at
+# THRESHOLD, so duplicates are rarely missed
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+SHINGLE_SIZE = 4
+THRESHOLD = 0.7             # estimated similarity reported as a duplicate
+
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 64) - 1
+
+
+def _seeded(i, salt):
+    return int.from_bytes(hashlib.blake2b(f'{salt}{i}'.encode(), digest_size=8).digest(), 'big')
+
+
+# Fixed permutations h(x) = (a*x + b) mod p; they must never change, or
+# stored signatures stop matching new ones
+_PERMUTATIONS = [(_seeded(i, 'a') % (_PRIME - 1) + 1, _seeded(i, 'b') % _PRIME) for i in range(NUM_HASHES)]
+
+
+def create_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS question_signatures (
+            question_id INTEGER PRIMARY KEY,
+            signature BLOB NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS question_lsh (
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            PRIMARY KEY (band, bucket, question_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_question_lsh_question ON question_lsh(question_id)')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS question_lsh_delete
+        AFTER DELETE ON questions
+        BEGIN
+            DELETE FROM question_signatures WHERE question_id = old.id;
+            DELETE FROM question_lsh WHERE question_id = old.id;
+        END
+    ''')
+
+
+def shingles(text):
+    text = ' '.join(normalize_arabic(text or '').lower().split())
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def signature(text):
+    values = [int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'big') % _PRIME
+              for shingle in shingles(text)]
+    if not values:
+        return array('Q', [_MASK] * NUM_HASHES)
+    return array('Q', [min((a * value + b) % _PRIME for value in values) for a, b in _PERMUTATIONS])
+
+
+def _buckets(sig):
+    # One signed 64-bit bucket id per band, as SQLite integers
+    for band in range(BANDS):
+        digest = hashlib.blake2b(sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).digest()
+        yield band, struct.unpack('<q', digest)[0]
+
+
+def similarity(first, second):
+    return sum(map(operator.eq, first, second)) / NUM_HASHES
+
+
+def _load_signature(blob):
+    sig = array('Q')
+    sig.frombytes(blob)
+    return sig
+
+
+def index_question(conn, question_id, text):
+    # Call in the transaction that inserts or edits the question
+    sig = signature(text)
+    conn.execute('DELETE FROM question_lsh WHERE question_id = ?', (question_id,))
+    conn.execute('INSERT OR REPLACE INTO question_signatures (question_id, signature) VALUES (?, ?)',
+                 (question_id, sig.tobytes()))
+    conn.executemany('INSERT INTO question_lsh (band, bucket, question_id) VALUES (?, ?, ?)',
+                     [(band, bucket, question_id) for band, bucket in _buckets(sig)])
+
+
+def rebuild_index(conn):
+    conn.execute('DELETE FROM question_lsh')
+    conn.execute('DELETE FROM question_signatures')
+    for question_id, text in conn.execute('SELECT id, question_text FROM questions').fetchall():
+        index_question(conn, question_id, text)
+
+
+def find_duplicates(conn, text, exclude=None, threshold=THRESHOLD, limit=10):
+    # Existing questions whose text is likely a rewording of text, most
+    # similar first: [{'id', 'question_text', 'similarity'}]
+    sig = signature(text)
+    buckets = list(_buckets(sig))
+    # One primary-key probe per band
+    candidates = conn.execute(f'''
+        WITH probe (band, bucket) AS (VALUES {', '.join(['(?, ?)'] * len(buckets))})
+        SELECT DISTINCT question_signatures.question_id, question_signatures.signature
+        FROM probe
+        JOIN question_lsh ON question_lsh.band = probe.band AND question_lsh.bucket = probe.bucket
+        JOIN question_signatures ON question_signatures.question_id = question_lsh.question_id
+    ''', [value for bucket in buckets for value in bucket]).fetchall()
+
+    scored = []
+    for question_id, blob in candidates:
+        if question_id == exclude:
+            continue
+        score = similarity(sig, _load_signature(blob))
+        if score >= threshold:
+            scored.append((score, question_id))
+    scored.sort(reverse=True)
+    scored = scored[:limit]
+    if not scored:
+        return []
+
+    texts = dict(conn.execute(f'''
+        SELECT id, question_text FROM questions WHERE id IN ({', '.join('?' * len(scored))})
+    ''', [question_id for _, question_id in scored]).fetchall())
+    return [{'id': question_id, 'question_text': texts.get(question_id, ''), 'similarity': round(score, 2)}
+            for score, question_id in scored]
+
+
+def duplicate_clusters(conn, threshold=THRESHOLD):
+    # Groups of two or more questions linked by pairwise similarity above
+    # threshold, largest first. Only questions sharing an LSH bucket are
+    # ever compared.
+    pairs = set()
+    for (members,) in conn.execute('''
+        SELECT group_concat(question_id) FROM question_lsh
+        GROUP BY band, bucket HAVING count(*) > 1
+    '''):
+        ids = sorted(int(question_id) for question_id in members.split(','))
+        pairs.update((first, second) for i, first in enumerate(ids) for second in ids[i + 1:])
+    if not pairs:
+        return []
+
+    ids = sorted({question_id for pair in pairs for question_id in pair})
+    signatures = {}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        signatures.update((question_id, _load_signature(blob)) for question_id, blob in conn.execute(f'''
+            SELECT question_id, signature FROM question_signatures
+            WHERE question_id IN ({', '.join('?' * len(chunk))})
+        ''', chunk))
+
+    # Union-find over the confirmed pairs
+    parent = {}
+
+    def root(question_id):
+        parent.setdefault(question_id, question_id)
+        while parent[question_id] != question_id:
+            parent[question_id] = parent[parent[question_id]]
+            question_id = parent[question_id]
+        return question_id
+
+    for first, second in pairs:
+        first_root, second_root = root(first), root(second)
+        # Pairs already joined through other members need no comparison
+        if first_root != second_root and similarity(signatures[first], signatures[second]) >= threshold:
+            parent[first_root] = second_root
+
+    clusters = {}
+    for question_id in parent:
+        clusters.setdefault(root(question_id), []).append(question_id)
+    return sorted((sorted(members) for members in clusters.values() if len(members) > 1),
+                  key=lambda members: (-len(members), members[0]))
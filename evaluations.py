@@ -0,0 +1,122 @@
+# Head-of-department evaluations.
+#
+# Each evaluation kind lists the score columns an admin fills in next to
+# the faculty member's self-assessment. apply_evaluations() writes any
+# number of users' scores in one transaction with a single executemany,
+# recomputing evaluation_sum in the UPDATE itself, and reports the outcome
+# of every submitted row.
+import json
+
+MAX_SCORE = 5
+
+EVALUATIONS = {
+    'Scientific_production': {
+        'table': 'Scientific_production',
+        'label': 'الإنتاج العلمي و الأنشطة العلمية و المهنية',
+        # (score column, self-assessment column, label)
+        'fields': [
+            ('Scientific_research_Evaluation', 'Scientific_research', 'البحث العلمي'),
+            ('supervision_Graduation_Evaluation', 'supervision_Graduation', 'الاشراف على الرسائل العلمية'),
+        ],
+    },
+    'criteria': {
+        'table': 'Evaluation_aspects',
+        'label': 'جوانب و معايير التقويم و مؤشرات الأداء',
+        'fields': [
+            ('Develop_courses_Evaluation', 'Develop_courses', 'تطوير المقررات'),
+            ('Prepare_file_Evaluation', 'Prepare_file', 'ملف المقرر'),
+            ('Electronic_tests_Evaluation', 'Electronic_tests', 'الاختبارات الالكترونية'),
+            ('Prepare_material_Evaluation', 'Prepare_material_content', 'المحتوى الالكتروني'),
+            ('Use_learning_Evaluation', 'Use_learning_effectively', 'مصادر التعلم الرقمية'),
+            ('teaching_methods_Evaluation', 'teaching_methods', 'أساليب التدريس'),
+            ('Methods_student_Evaluation', 'Methods_student', 'تقييم الطالب'),
+            ('preparing_test_Evaluation', 'preparing_test_questions', 'أسئلة الاختبارات'),
+            ('Provide_academic_Evaluation', 'Provide_academic_guidance', 'الارشاد الأكاديمي'),
+        ],
+    },
+    'university': {
+        'table': 'university_evaluation',
+        'label': 'خدمة القسم و الكلية و الجامعة',
+        'fields': [
+            ('department_load_Evaluation', 'department_load', 'أعمال القسم والكلية'),
+            ('workshop_develop_Evaluation', 'workshop_develop', 'ورش التطوير'),
+            ('program_bank_Evaluation', 'program_bank', 'بنك المسؤولية المجتمعية'),
+            ('medical_services_Evaluation', 'medical_services', 'الخدمات العلاجية'),
+        ],
+    },
+}
+
+
+def _update_sql(evaluation):
+    columns = [field[0] for field in evaluation['fields']]
+    assignments = [f'{column} = :{column}' for column in columns]
+    # The right-hand side of an UPDATE sees the old row, so the sum is
+    # built from the new parameters rather than the columns
+    total = ' + '.join(f'COALESCE(:{column}, 0)' for column in columns)
+    return f'''
+        UPDATE {evaluation['table']} SET {', '.join(assignments)}, evaluation_sum = {total}
+        WHERE user_id = :user_id
+    '''
+
+
+for _evaluation in EVALUATIONS.values():
+    _evaluation['update_sql'] = _update_sql(_evaluation)
+
+
+def validate_scores(evaluation, scores):
+    # scores maps score column -> submitted value. A blank score is stored
+    # as NULL and counts as zero towards evaluation_sum.
+    params = {}
+    for column, _, label in evaluation['fields']:
+        value = scores.get(column)
+        if value is None or str(value).strip() == '':
+            params[column] = None
+            continue
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'{column} must be a whole number')
+        if not 0 <= value <= MAX_SCORE:
+            raise ValueError(f'{column} must be between 0 and {MAX_SCORE}')
+        params[column] = value
+    return params
+
+
+def apply_evaluations(conn, kind, rows):
+    # rows: [{'user_id': ..., <score column>: ...}, ...]. Returns one result
+    # per submitted row: status is 'updated', 'not_found' or 'invalid'.
+    evaluation = EVALUATIONS[kind]
+    results, batch = [], []
+
+    for row in rows:
+        if not isinstance(row, dict):
+            results.append({'user_id': None, 'status': 'invalid', 'error': 'each row must be an object'})
+            continue
+        try:
+            user_id = int(row.get('user_id'))
+        except (TypeError, ValueError):
+            results.append({'user_id': row.get('user_id'), 'status': 'invalid', 'error': 'user_id is required'})
+            continue
+        try:
+            params = validate_scores(evaluation, row)
+        except ValueError as e:
+            results.append({'user_id': user_id, 'status': 'invalid', 'error': str(e)})
+            continue
+        params['user_id'] = user_id
+        results.append({'user_id': user_id, 'status': 'updated'})
+        batch.append(params)
+
+    # One indexed lookup tells which users have a row to evaluate
+    existing = {row[0] for row in conn.execute(f'''
+        SELECT DISTINCT user_id FROM {evaluation['table']}
+        WHERE user_id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps([params['user_id'] for params in batch]),))}
+    for result in results:
+        if result['status'] == 'updated' and result['user_id'] not in existing:
+            result['status'] = 'not_found'
+            result['error'] = 'no submission to evaluate'
+
+    with conn:
+        conn.executemany(evaluation['update_sql'],
+                         [params for params in batch if params['user_id'] in existing])
+    return results
@@ -0,0 +1,117 @@
+# Streaming CSV / XLSX export of the admin datasets.
+#
+# Rows are pulled from the cursor EXPORT_CHUNK_SIZE at a time with
+# fetchmany() and written out as they arrive, so memory stays flat no
+# matter how many years of records a table holds.
+import csv
+import io
+import os
+import tempfile
+
+from db import year_range
+
+EXPORT_DATASETS = {
+    'Scientific_production': {'table': 'Scientific_production'},
+    'criteria_of_evaluation': {'table': 'Evaluation_aspects'},
+    'university_evaluation': {'table': 'university_evaluation'},
+    'semesters': {'table': 'academic_data', 'semester_column': 'semester'},
+    'activities': {'table': 'activity_data'},
+}
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class ExportFormatError(ValueError):
+    pass
+
+
+def export_query(dataset_name, user_id=None, semester=None, year=None, source=None):
+    # source replaces the table in FROM, e.g. archive.history_source() to
+    # include archived years
+    dataset = EXPORT_DATASETS[dataset_name]
+    table = dataset['table']
+    query = f'''
+        SELECT users.username, users.full_name, {table}.*
+        FROM {source or table}
+        JOIN users ON {table}.user_id = users.id
+    '''
+    where, params = [], []
+    if user_id is not None:
+        where.append(f'{table}.user_id = ?')
+        params.append(user_id)
+    if semester and 'semester_column' in dataset:
+        where.append(f"{table}.{dataset['semester_column']} = ?")
+        params.append(semester)
+    if year is not None:
+        where.append(f'{table}.created_at >= ? AND {table}.created_at < ?')
+        params.extend(year_range(year))
+    if where:
+        query += ' WHERE ' + ' AND '.join(where)
+    query += f' ORDER BY {table}.created_at DESC, {table}.id DESC'
+    return query, params
+
+
+def _chunks(cursor, size):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def iter_csv(cursor, chunk_size=1000):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # The BOM makes Excel open the Arabic text as UTF-8
+    buffer.write('\ufeff')
+    writer.writerow([column[0] for column in cursor.description])
+    for rows in _chunks(cursor, chunk_size):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_xlsx(cursor, chunk_size=1000, read_size=64 * 1024):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ExportFormatError('XLSX export needs the openpyxl package; export as CSV instead')
+
+    # A write-only workbook streams rows to a temporary file as they are
+    # appended; the finished file is then sent in fixed-size pieces
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append([column[0] for column in cursor.description])
+
+    def generate():
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            for rows in _chunks(cursor, chunk_size):
+                for row in rows:
+                    sheet.append(list(row))
+            workbook.save(path)
+            with open(path, 'rb') as f:
+                while True:
+                    data = f.read(read_size)
+                    if not data:
+                        break
+                    yield data
+        finally:
+            os.remove(path)
+
+    return generate()
+
+
+def export_rows(conn, dataset_name, fmt, chunk_size=1000, **filters):
+    query, params = export_query(dataset_name, **filters)
+    cursor = conn.execute(query, params)
+    if fmt == 'xlsx':
+        return iter_xlsx(cursor, chunk_size)
+    return iter_csv(cursor, chunk_size)
@@ -0,0 +1,86 @@
+# A faculty member's full record in one read.
+#
+# load_dossier() gathers the member's profile and every row of theirs in
+# DOSSIER_SECTIONS with a single UNION ALL statement: one round trip, one
+# consistent snapshot, and each branch served by the table's
+# (user_id, created_at) index. Rows come back as JSON objects built by
+# SQLite, so the statement does not depend on the tables sharing columns.
+# Years moved out of the live tables by `flask archive-records` are read
+# back from their archives (archive.history_source()), so the dossier
+# covers the member's whole career.
+# The /faculty/<user_id> page caches the result per user, see
+# http_cache.py and user_versions in versions.py.
+import json
+import threading
+
+import archive
+from categories import CODED_COLUMNS, code_column
+
+# (section, table, label), every table with a user_id column
+DOSSIER_SECTIONS = [
+    ('semesters', 'academic_data', 'المقررات'),
+    ('activities', 'activity_data', 'برامج التطوير المهني'),
+    ('research', 'Scientific_research', 'البحث العلمي'),
+    ('conferences', 'participate_conference', 'المشاركة في الندوات والمؤتمرات'),
+    ('university_service', 'University_Service', 'خدمة القسم و الكلية و الجامعة'),
+    ('criteria_of_evaluation', 'Evaluation_aspects', 'جوانب و معايير التقويم و مؤشرات الأداء'),
+    ('Scientific_production', 'Scientific_production', 'الإنتاج العلمي و الأنشطة العلمية و المهنية'),
+    ('university_evaluation', 'university_evaluation', 'تقويم خدمة القسم و الكلية و الجامعة'),
+]
+
+# Kept in the JSON but not shown on the page
+HIDDEN_COLUMNS = ['id', 'user_id'] + [code_column(column) for _, column, _ in CODED_COLUMNS]
+
+# The profile; the password hash stays out of the dossier
+USER_COLUMNS = ['id', 'username', 'full_name', 'role', 'department']
+
+# (database, archived years) -> the dossier statement; the columns are
+# read once, after the migrations have run
+_statements = {}
+_statements_lock = threading.Lock()
+
+
+def _json_object(columns):
+    return 'json_object(' + ', '.join(f"'{column}', \"{column}\"" for column in columns) + ')'
+
+
+def _build_statement(conn, database, archive_dir, years):
+    selects = [f'''
+        SELECT 'user' AS section, NULL AS created_at, NULL AS id, {_json_object(USER_COLUMNS)} AS record
+        FROM users WHERE id = :user_id
+    ''']
+    for section, table, _ in DOSSIER_SECTIONS:
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+        source = archive.history_source(conn, database, archive_dir, table, years)
+        selects.append(f'''
+            SELECT '{section}', created_at, id, {_json_object(columns)}
+            FROM {source} WHERE user_id = :user_id
+        ''')
+    return '\nUNION ALL\n'.join(selects) + '\nORDER BY created_at DESC, id DESC'
+
+
+def load_dossier(conn, database, archive_dir, user_id):
+    # {'user': profile, section: [rows, newest first]}, or None for an
+    # unknown user. Raises archive.ArchiveError when there are more
+    # archived years than SQLite can attach.
+    years = archive.archived_years(database, archive_dir)
+    key = (database, tuple(years))
+    with _statements_lock:
+        statement = _statements.get(key)
+    if statement is None:
+        statement = _build_statement(conn, database, archive_dir, years)
+        with _statements_lock:
+            _statements[key] = statement
+    else:
+        archive.attach_archives(conn, database, archive_dir, years)
+
+    dossier = {section: [] for section, _, _ in DOSSIER_SECTIONS}
+    dossier['user'] = None
+    for section, _, _, record in conn.execute(statement, {'user_id': user_id}):
+        if section == 'user':
+            dossier['user'] = json.loads(record)
+        else:
+            dossier[section].append(json.loads(record))
+    if dossier['user'] is None:
+        return None
+    return dossier
@@ -0,0 +1,212 @@
+# Data-entry form registry.
+#
+# Every form a faculty member fills in is declared here once: the table it
+# writes, its fields with their types, and any derived sum column. At
+# import time each declaration is compiled into a fixed INSERT statement
+# and a validator, and app.py serves all of them through one generic view.
+# Because the SQL text never varies, sqlite3's per-connection statement
+# cache prepares each INSERT once and reuses it for every later write.
+import re
+
+from categories import CODED_COLUMNS, classify, code_column
+
+DATE_FORMAT = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+# Field tuples are (column, form field, type, required). Types follow the
+# form inputs: 'int' for number inputs, 'date' for date inputs
+# (YYYY-MM-DD), 'text' for everything else.
+FORMS = {
+    'semester': {
+        'endpoint': 'semester_data',
+        'rule': '/semester_add',
+        'template': 'add_semester.html',
+        'label': 'المقررات الدراسية',
+        'table': 'academic_data',
+        'fields': [
+            ('semester', 'semester', 'text', True),
+            ('course_code', 'course_code', 'text', True),
+            ('num_students', 'num_students', 'int', False),
+            ('teaching_load', 'teaching_load', 'int', False),
+            ('course_name', 'course_name', 'text', False),
+            ('semester_type', 'semester_type', 'text', False),
+            ('credit_hours', 'credit_hours', 'int', False),
+        ],
+    },
+    'Scientific_production': {
+        'endpoint': 'Scientific_production_data',
+        'rule': '/Scientific_production',
+        'template': 'Scientific_production.html',
+        'label': 'الإنتاج العلمي و الأنشطة العلمية و المهنية',
+        'table': 'Scientific_production',
+        'fields': [
+            ('Scientific_research', 'Scientific_research', 'int', True),
+            ('supervision_Graduation', 'supervision_Graduation', 'int', True),
+        ],
+        # (column, summed columns)
+        'sum': ('Scientific_sum', ['Scientific_research', 'supervision_Graduation']),
+    },
+    'criteria': {
+        'endpoint': 'cirteria_data',
+        'rule': '/cirteria_add',
+        'template': 'criteria_of_evaluation.html',
+        'label': 'جوانب و معايير التقويم و مؤشرات الأداء',
+        'table': 'Evaluation_aspects',
+        'fields': [
+            ('Develop_courses', 'Develop_courses', 'int', True),
+            ('Prepare_file', 'Prepare_file', 'int', True),
+            ('Electronic_tests', 'Electronic_tests', 'int', False),
+            ('Prepare_material_content', 'Prepare_material_content', 'int', False),
+            ('Use_learning_effectively', 'Use_learning_effectively', 'int', False),
+            ('teaching_methods', 'teaching_methods', 'int', False),
+            ('Methods_student', 'Methods_student', 'int', False),
+            ('preparing_test_questions', 'preparing_test_questions', 'int', False),
+            ('Provide_academic_guidance', 'Provide_academic_guidance', 'int', False),
+        ],
+        'sum': ('aspects_sum', [
+            'Develop_courses', 'Prepare_file', 'Electronic_tests',
+            'Prepare_material_content', 'Use_learning_effectively',
+            'teaching_methods', 'Methods_student', 'preparing_test_questions',
+            'Provide_academic_guidance',
+        ]),
+    },
+    'university_evaluation': {
+        'endpoint': 'university_evaluation',
+        'rule': '/university_evaluation',
+        'template': 'university_evaluation.html',
+        'label': 'خدمة القسم و الكلية و الجامعة',
+        'table': 'university_evaluation',
+        'fields': [
+            ('department_load', 'department_load', 'int', True),
+            ('workshop_develop', 'workshop_develop', 'int', True),
+            ('program_bank', 'program_bank', 'int', False),
+            ('medical_services', 'medical_services', 'int', False),
+        ],
+        'sum': ('aspects_sum', ['department_load', 'workshop_develop', 'program_bank', 'medical_services']),
+    },
+    'conference': {
+        'endpoint': 'prticipation_data',
+        'rule': '/prticipation_add',
+        'template': 'Participation_in_conferences.html',
+        'label': 'المشاركة في الندوات والمؤتمرات',
+        'table': 'participate_conference',
+        'fields': [
+            ('location', 'location', 'text', True),
+            ('type_part', 'type_part', 'text', True),
+            ('place', 'place', 'text', False),
+            ('year', 'year', 'date', False),
+        ],
+    },
+    'university_service': {
+        'endpoint': 'University_Service',
+        'rule': '/university',
+        'template': 'University_Service.html',
+        'label': 'الخدمة الجامعية',
+        'table': 'University_Service',
+        'fields': [
+            ('task_level', 'task_level', 'text', False),
+            ('task_type', 'task_type', 'text', True),
+            ('notes', 'notes', 'text', False),
+        ],
+    },
+    'activity': {
+        'endpoint': 'activity_data',
+        'rule': '/activity_add',
+        'template': 'add_activity.html',
+        'label': 'برامج التطوير المهني',
+        'table': 'activity_data',
+        'fields': [
+            ('activity_title', 'activity_title', 'text', False),
+            ('activity_date', 'date', 'date', False),
+            ('duration', 'duration', 'text', False),
+            ('participation_type', 'participation_type', 'text', False),
+            ('place', 'place', 'text', False),
+        ],
+    },
+    'research': {
+        'endpoint': 'program_data',
+        'rule': '/program_add',
+        'template': 'add_program.html',
+        'label': 'البحث العلمي',
+        'table': 'Scientific_research',
+        'fields': [
+            ('scientific_output', 'scientific_output', 'text', False),
+            ('Authors_names', 'Authors_names', 'text', False),
+            ('Publisher', 'Publisher', 'text', False),
+            ('Agency', 'Agency', 'text', False),
+            ('year', 'year', 'date', False),
+            ('research_type', 'research_type', 'text', False),
+        ],
+    },
+}
+
+
+def convert(value, kind, required):
+    value = (value or '').strip()
+    if value == '':
+        if required:
+            raise ValueError('is required')
+        return None
+    if kind == 'int':
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f'must be a whole number, got {value!r}')
+    if kind == 'date' and not DATE_FORMAT.match(value):
+        raise ValueError(f'must be a date as YYYY-MM-DD, got {value!r}')
+    return value
+
+
+def _compile(schema):
+    fields = schema['fields']
+    columns = ['user_id'] + [field[0] for field in fields]
+    summed = []
+    if 'sum' in schema:
+        sum_column, sum_fields = schema['sum']
+        columns.append(sum_column)
+        # Offsets into the converted values, which follow the field order
+        summed = [[field[0] for field in fields].index(name) for name in sum_fields]
+
+    # (category, offset of its label) for the table's coded columns
+    coded = []
+    for table, column, category in CODED_COLUMNS:
+        if table == schema['table']:
+            columns.append(code_column(column))
+            coded.append((category, [field[0] for field in fields].index(column)))
+
+    schema['columns'] = columns
+    schema['insert_sql'] = f'''
+        INSERT INTO {schema['table']} ({', '.join(columns)})
+        VALUES ({', '.join('?' * len(columns))})
+    '''
+
+    def validate(data):
+        # Turn submitted form data (or an import row with the same keys)
+        # into the values for every column after user_id. Raises ValueError
+        # naming the first offending field.
+        values = []
+        for column, key, kind, required in fields:
+            raw = data.get(key, data.get(column))
+            try:
+                values.append(convert(raw, kind, required))
+            except ValueError as e:
+                raise ValueError(f'{key} {e}')
+        if summed:
+            values.append(sum(values[i] or 0 for i in summed))
+        values.extend(classify(category, values[i]) for category, i in coded)
+        return tuple(values)
+
+    schema['validate'] = validate
+    return schema
+
+
+for _schema in FORMS.values():
+    _compile(_schema)
+
+
+def insert_record(conn, schema, user_id, values):
+    conn.execute(schema['insert_sql'], (user_id,) + values)
+
+
+def insert_records(conn, schema, rows):
+    # rows are (user_id,) + values tuples
+    conn.executemany(schema['insert_sql'], rows)
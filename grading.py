@@ -0,0 +1,151 @@
+# Structured question options and batch grading.
+#
+# A question's options are stored one row per letter in question_options;
+# questions.options keeps the same options rendered as "A. text" lines for
+# display and editing, and questions.correct_answer the letter of the
+# right option. grade_sheets() scores any number of answer sheets against
+# an in-memory answer key: correct letters are loaded once per question
+# and kept until the questions table changes, so grading a cohort is a
+# dict lookup per answer.
+import json
+import re
+import threading
+
+from versions import table_versions
+
+# A letter only counts as the option's key when a separator follows it,
+# so "ATP synthase" is an option text, not "A" + "TP synthase"
+OPTION_LINE = re.compile(r'^\s*([A-Za-z])\s*[.):\-]\s*(.*)$')
+
+_keys = {}
+_keys_lock = threading.Lock()
+
+
+def create_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS question_options (
+            question_id INTEGER NOT NULL,
+            letter TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            option_text TEXT NOT NULL,
+            PRIMARY KEY (question_id, letter)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS question_options_delete
+        AFTER DELETE ON questions
+        BEGIN
+            DELETE FROM question_options WHERE question_id = old.id;
+        END
+    ''')
+
+
+def parse_options(text):
+    # "A. first\nB) second" -> [('A', 'first'), ('B', 'second')]. Raises
+    # ValueError for fewer than two options or a repeated letter.
+    options = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        match = OPTION_LINE.match(line)
+        if match:
+            options.append((match.group(1).upper(), match.group(2).strip()))
+        else:
+            # Not lettered: kept whole and keyed by its position (A, B, C...)
+            options.append((chr(ord('A') + len(options)), line.strip()))
+    if len(options) < 2:
+        raise ValueError('At least two options are required!')
+    letters = [letter for letter, _ in options]
+    if len(set(letters)) != len(letters):
+        raise ValueError('Each option needs its own letter!')
+    return options
+
+
+def format_options(options):
+    return '\n'.join(f'{letter}. {text}' for letter, text in options)
+
+
+def check_answer(options, correct_answer):
+    if correct_answer not in {letter for letter, _ in options}:
+        raise ValueError('Correct answer must match one of the option letters!')
+
+
+def save_options(conn, question_id, options):
+    conn.execute('DELETE FROM question_options WHERE question_id = ?', (question_id,))
+    conn.executemany(
+        'INSERT INTO question_options (question_id, letter, position, option_text) VALUES (?, ?, ?, ?)',
+        [(question_id, letter, position, text) for position, (letter, text) in enumerate(options)],
+    )
+
+
+def load_options(conn, question_id):
+    return conn.execute('''
+        SELECT letter, option_text FROM question_options
+        WHERE question_id = ? ORDER BY position
+    ''', (question_id,)).fetchall()
+
+
+def backfill_options(conn):
+    # Split the options of questions saved before question_options existed;
+    # blobs that do not parse are left for the next edit of the question
+    rows = conn.execute('''
+        SELECT id, options FROM questions
+        WHERE id NOT IN (SELECT question_id FROM question_options)
+    ''').fetchall()
+    for question_id, text in rows:
+        try:
+            options = parse_options(text)
+        except ValueError:
+            continue
+        save_options(conn, question_id, options)
+
+
+def answer_key(conn, database, question_ids):
+    # {question id: correct letter} for the requested ids that exist. Any
+    # insert, edit or delete of a question drops the cached keys.
+    versions = table_versions(conn, ['questions'])
+    with _keys_lock:
+        cached = _keys.get(database)
+        if cached is None or cached[0] != versions:
+            cached = _keys[database] = (versions, {})
+        keys = cached[1]
+        missing = [question_id for question_id in question_ids if question_id not in keys]
+
+    if missing:
+        loaded = dict(conn.execute('''
+            SELECT id, correct_answer FROM questions
+            WHERE id IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(missing),)).fetchall())
+        with _keys_lock:
+            # Only ids that exist are kept: the ids come from uploaded
+            # sheets, and remembering unknown ones would grow without bound
+            keys.update(loaded)
+    return {question_id: keys[question_id] for question_id in question_ids if keys.get(question_id)}
+
+
+def grade_sheets(key, sheets, questions=None):
+    # sheets: [{'student': ..., 'answers': {question id: letter}}]. With
+    # questions (the paper's ids) unanswered questions count against the
+    # student; otherwise a sheet is marked out of the questions it answers.
+    results = []
+    for sheet in sheets:
+        answers = {int(question_id): str(letter).strip().upper()
+                   for question_id, letter in (sheet.get('answers') or {}).items()}
+        marked = questions if questions is not None else list(answers)
+        wrong, unknown, score = [], [], 0
+        for question_id in marked:
+            correct = key.get(question_id)
+            if correct is None:
+                unknown.append(question_id)
+            elif answers.get(question_id) == correct:
+                score += 1
+            else:
+                wrong.append(question_id)
+        results.append({
+            'student': sheet.get('student'),
+            'score': score,
+            'total': len(marked) - len(unknown),
+            'wrong': wrong,
+            'unknown': unknown,
+        })
+    return results
@@ -0,0 +1,135 @@
+# Conditional GETs and cached pages for the read-heavy views.
+#
+# A view decorated with @cached_view(tables) is keyed on the change counters
+# of the tables it reads (see versions.py) together with the role and user
+# of the session, since the pages greet the user and show admin-only links.
+# Every response carries an ETag built from that key: a browser revisiting
+# an unchanged page sends it back in If-None-Match and gets a 304 after a
+# single primary-key read of table_versions, without the view's queries or
+# any rendering. Otherwise the page's HTML is served from an in-process LRU
+# cache while the counters match, and the view only runs after a write to
+# one of its tables has bumped them. Code that changes what a page shows
+# without going through the SQLite triggers bumps the counters itself with
+# versions.bump_table_versions(), which reaches every worker and process;
+# clear() only empties the cache of the current process.
+#
+# A page about one user (@cached_view(per_user='user_id')) is keyed on that
+# user's counter in user_versions instead, so other users' writes leave it
+# cached. JSON responses are cached like pages.
+import functools
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import current_app, request, session
+
+import assets
+from db import get_db
+from versions import table_versions, user_version
+
+DEFAULT_CONFIG = {
+    'HTTP_CACHE': True,
+    'HTTP_CACHE_SIZE': 512,             # cached pages per process
+}
+
+_pages = OrderedDict()
+_pages_lock = threading.Lock()
+_config = dict(DEFAULT_CONFIG)
+CACHED_MIMETYPES = {'text/html', 'application/json'}
+# endpoint -> whether its page displays flash messages, learnt on first sight
+_shows_flashes = {}
+# Changes with the templates and the asset build, so a deploy does not
+# keep serving old pages
+_salt = ''
+
+
+def clear():
+    with _pages_lock:
+        _pages.clear()
+
+
+def _get(key):
+    with _pages_lock:
+        entry = _pages.get(key)
+        if entry is not None:
+            _pages.move_to_end(key)
+        return entry
+
+
+def _put(key, entry):
+    with _pages_lock:
+        _pages[key] = entry
+        _pages.move_to_end(key)
+        while len(_pages) > _config['HTTP_CACHE_SIZE']:
+            _pages.popitem(last=False)
+
+
+def _etag(key, versions):
+    return hashlib.blake2b(repr((_salt, key, versions)).encode(), digest_size=12).hexdigest()
+
+
+def _finish(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+
+def cached_view(tables=(), per_user=None):
+    # per_user names the view argument holding the user the page is about
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not _config['HTTP_CACHE'] or request.method != 'GET':
+                return view(*args, **kwargs)
+            # Pending flash messages are shown once by the pages whose
+            # template displays them, so those are rendered afresh and not
+            # kept; pages that leave the messages pending are cached as usual
+            if '_flashes' in session and _shows_flashes.get(request.endpoint, True):
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code == 200:
+                    _shows_flashes[request.endpoint] = '_flashes' not in session
+                return response
+
+            key = (current_app.config['DATABASE'], request.endpoint, tuple(sorted(kwargs.items())),
+                   tuple(sorted(request.args.items(multi=True))), session.get('role'), session.get('user_id'))
+            conn = get_db()
+            versions = table_versions(conn, tables) if tables else ()
+            if per_user is not None:
+                versions += (user_version(conn, kwargs[per_user]),)
+            etag = _etag(key, versions)
+            if request.if_none_match.contains(etag):
+                return _finish(current_app.response_class(status=304), etag)
+
+            entry = _get(key)
+            if entry is not None and entry[0] == versions:
+                return _finish(current_app.response_class(entry[1], mimetype=entry[2]), etag)
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed or response.mimetype not in CACHED_MIMETYPES:
+                return response
+            _put(key, (versions, response.get_data(as_text=True), response.mimetype))
+            return _finish(response, etag)
+        return wrapper
+    return decorator
+
+
+def _deploy_fingerprint(app):
+    stamps = []
+    for folder, _, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        for name in files:
+            path = os.path.join(folder, name)
+            stamps.append((path, os.stat(path).st_mtime_ns))
+    manifest = assets.manifest_path(app)
+    if os.path.exists(manifest):
+        stamps.append((manifest, os.stat(manifest).st_mtime_ns))
+    return hashlib.blake2b(repr(sorted(stamps)).encode(), digest_size=8).hexdigest()
+
+
+def init_app(app):
+    global _salt
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+    _config.update({key: app.config[key] for key in DEFAULT_CONFIG})
+    _salt = _deploy_fingerprint(app)
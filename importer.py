@@ -0,0 +1,147 @@
+# Bulk import of faculty records from CSV or XLSX spreadsheets.
+#
+# Files are parsed row by row and inserted in batches of IMPORT_BATCH_SIZE
+# rows, one transaction per batch, so a registrar sheet with thousands of
+# courses never sits in memory at once. Rows that fail validation are
+# reported with their line number and skipped; the rest of the file still
+# goes in. Each row names its owner in a ``username`` (or ``user_id``)
+# column; the other headers are the form field names from forms.py.
+# A CSV that is not UTF-8 is read as CP1256 (Excel on Arabic Windows); a
+# file that cannot be parsed at all raises ImportFormatError.
+import codecs
+import csv
+import io
+import zipfile
+from datetime import date, datetime
+from forms import FORMS, insert_records
+
+# Datasets that can be imported, by registry name; rows are validated
+# exactly like the corresponding add form
+IMPORT_DATASETS = {name: FORMS[name] for name in ('semester', 'activity', 'research')}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def validate_row(schema, row, users, user_ids):
+    # Resolve the row's owner, then validate the rest like a form submission.
+    # Returns the parameter tuple for the INSERT; raises ValueError.
+    username = row.get('username', '')
+    if username:
+        if username not in users:
+            raise ValueError(f'unknown username {username!r}')
+        user_id = users[username]
+    else:
+        try:
+            user_id = int(row.get('user_id', ''))
+        except ValueError:
+            raise ValueError('username or user_id is required')
+        if user_id not in user_ids:
+            raise ValueError(f'unknown user_id {user_id}')
+    return (user_id,) + schema['validate'](row)
+
+
+def _csv_encoding(stream):
+    # UTF-8 (with or without a BOM) when every byte decodes as such;
+    # otherwise CP1256, which Excel on Arabic Windows saves CSV files in
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for chunk in iter(lambda: stream.read(64 * 1024), b''):
+            decoder.decode(chunk)
+        decoder.decode(b'', final=True)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'cp1256'
+    finally:
+        stream.seek(0)
+
+
+def _csv_rows(stream):
+    text = io.TextIOWrapper(stream, encoding=_csv_encoding(stream), newline='')
+    reader = csv.reader(text)
+    try:
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [_cell(name) for name in header]
+        for values in reader:
+            # Blank lines, such as the trailing ones spreadsheets write
+            if not any(value.strip() for value in values):
+                continue
+            yield dict(zip(header, (_cell(value) for value in values)))
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise ImportFormatError(f'Not a readable CSV file (line {reader.line_num}): {e}')
+
+
+def _xlsx_rows(stream):
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise ImportFormatError('XLSX import needs the openpyxl package; upload a CSV file instead')
+    # read_only mode streams the sheet XML instead of building the whole workbook
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, KeyError, InvalidFileException) as e:
+        raise ImportFormatError(f'Not a readable XLSX file: {e}')
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [_cell(name) for name in header]
+        for values in rows:
+            if values is None or all(value is None for value in values):
+                continue
+            yield dict(zip(header, (_cell(value) for value in values)))
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise ImportFormatError(f'Not a readable XLSX file: {e}')
+    finally:
+        workbook.close()
+
+
+def read_rows(stream, filename):
+    if filename.lower().endswith('.xlsx'):
+        return _xlsx_rows(stream)
+    if filename.lower().endswith('.csv'):
+        return _csv_rows(stream)
+    raise ImportFormatError('Only .csv and .xlsx files can be imported')
+
+
+def import_rows(conn, dataset_name, rows, batch_size=500):
+    schema = IMPORT_DATASETS[dataset_name]
+    users = {row['username']: row['id'] for row in conn.execute('SELECT id, username FROM users')}
+    user_ids = set(users.values())
+
+    report = {'inserted': 0, 'errors': []}
+    batch = []
+
+    def flush():
+        with conn:
+            insert_records(conn, schema, batch)
+        report['inserted'] += len(batch)
+        batch.clear()
+
+    # Line 1 is the header row
+    for line, row in enumerate(rows, start=2):
+        try:
+            batch.append(validate_row(schema, row, users, user_ids))
+        except ValueError as e:
+            report['errors'].append((line, str(e)))
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return report
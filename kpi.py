@@ -0,0 +1,155 @@
+# Materialized KPI summary.
+#
+# kpi_summary holds a single row with every figure the /kpis dashboard
+# shows. Triggers on the source tables keep it current on each insert,
+# update and delete, so the dashboard reads one row instead of running a
+# dozen aggregates. rebuild_kpi_summary() recomputes it from scratch, e.g.
+# after rows were loaded with the triggers bypassed.
+from categories import PUBLISHER_CONFERENCE, PUBLISHER_JOURNAL, RESEARCH_ACCEPTED, RESEARCH_PUBLISHED
+
+# Research is classified by its category codes, see categories.py
+ACCEPTED_CONFERENCE_RESEARCH = (
+    f'{{r}}.research_type_code = {RESEARCH_ACCEPTED} AND {{r}}.Publisher_code = {PUBLISHER_CONFERENCE}')
+PUBLISHED_JOURNAL_RESEARCH = (
+    f'{{r}}.research_type_code = {RESEARCH_PUBLISHED} AND {{r}}.Publisher_code = {PUBLISHER_JOURNAL}')
+
+# (column, table, value of one row): the column holds the sum of the value
+# over all rows of the table
+SUM_METRICS = [
+    ('users_count', 'users', '1'),
+    ('academic_count', 'academic_data', '1'),
+    ('university_service_count', 'University_Service', '1'),
+    ('accepted_research', 'Scientific_research', ACCEPTED_CONFERENCE_RESEARCH),
+    ('published_research', 'Scientific_research', PUBLISHED_JOURNAL_RESEARCH),
+    ('evaluation_aspects_total', 'Evaluation_aspects', '{r}.evaluation_sum'),
+    ('evaluation_aspects_n', 'Evaluation_aspects', '{r}.evaluation_sum IS NOT NULL'),
+    ('scientific_production_total', 'Scientific_production', '{r}.evaluation_sum'),
+    ('scientific_production_n', 'Scientific_production', '{r}.evaluation_sum IS NOT NULL'),
+    ('university_evaluation_total', 'university_evaluation', '{r}.evaluation_sum'),
+    ('university_evaluation_n', 'university_evaluation', '{r}.evaluation_sum IS NOT NULL'),
+]
+
+# (column, table, row filter): the column holds the number of distinct
+# users with at least one matching row. Per-user row counts live in
+# kpi_user_refs; the column moves only when a count crosses zero.
+DISTINCT_USER_METRICS = [
+    ('activity_users', 'activity_data', '1'),
+    ('research_members', 'Scientific_research', PUBLISHED_JOURNAL_RESEARCH),
+    ('conference_users', 'participate_conference', '1'),
+]
+
+COLUMNS = [m[0] for m in SUM_METRICS] + [m[0] for m in DISTINCT_USER_METRICS]
+SOURCE_TABLES = sorted({m[1] for m in SUM_METRICS + DISTINCT_USER_METRICS})
+
+
+def _value(expr, row):
+    return f'COALESCE(({expr.format(r=row)}), 0)'
+
+
+def _trigger_body(table, event, sum_metrics, distinct_metrics):
+    statements = []
+
+    assignments = []
+    for column, source, expr in sum_metrics:
+        if source != table:
+            continue
+        delta = {
+            'INSERT': f"+ {_value(expr, 'NEW')}",
+            'DELETE': f"- {_value(expr, 'OLD')}",
+            'UPDATE': f"+ {_value(expr, 'NEW')} - {_value(expr, 'OLD')}",
+        }[event]
+        assignments.append(f'{column} = {column} {delta}')
+    if assignments:
+        statements.append(f"UPDATE kpi_summary SET {', '.join(assignments)} WHERE id = 1;")
+
+    for column, source, expr in distinct_metrics:
+        if source != table:
+            continue
+        if event in ('DELETE', 'UPDATE'):
+            statements.append(f'''
+                UPDATE kpi_user_refs SET n = n - 1
+                WHERE metric = '{column}' AND user_id = OLD.user_id AND {_value(expr, 'OLD')};
+            ''')
+        if event in ('INSERT', 'UPDATE'):
+            statements.append(f'''
+                INSERT OR IGNORE INTO kpi_user_refs (metric, user_id, n)
+                SELECT '{column}', NEW.user_id, 0 WHERE {_value(expr, 'NEW')};
+            ''')
+            statements.append(f'''
+                UPDATE kpi_user_refs SET n = n + 1
+                WHERE metric = '{column}' AND user_id = NEW.user_id AND {_value(expr, 'NEW')};
+            ''')
+    return '\n'.join(statements)
+
+
+def install_triggers(conn, sum_metrics=SUM_METRICS, distinct_metrics=DISTINCT_USER_METRICS):
+    # Drop and recreate every KPI trigger from the metric lists (those above
+    # by default), so a migration that changes a metric only has to call
+    # this again
+    for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'kpi\\_%' ESCAPE '\\'"
+    ).fetchall():
+        conn.execute(f'DROP TRIGGER "{name}"')
+
+    tables = {m[1] for m in sum_metrics + distinct_metrics}
+    for table in sorted(tables):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+                CREATE TRIGGER kpi_{table}_{event.lower()}
+                AFTER {event} ON "{table}"
+                BEGIN
+                    {_trigger_body(table, event, sum_metrics, distinct_metrics)}
+                END
+            ''')
+
+    for column, _, _ in distinct_metrics:
+        conn.execute(f'''
+            CREATE TRIGGER kpi_refs_{column}_insert
+            AFTER INSERT ON kpi_user_refs WHEN NEW.metric = '{column}'
+            BEGIN
+                UPDATE kpi_summary SET {column} = {column} + (NEW.n > 0) WHERE id = 1;
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER kpi_refs_{column}_update
+            AFTER UPDATE OF n ON kpi_user_refs WHEN NEW.metric = '{column}'
+            BEGIN
+                UPDATE kpi_summary SET {column} = {column} + (NEW.n > 0) - (OLD.n > 0) WHERE id = 1;
+            END
+        ''')
+
+
+def rebuild_kpi_summary(conn, sum_metrics=SUM_METRICS, distinct_metrics=DISTINCT_USER_METRICS):
+    # With the summary row gone the triggers below have nothing to update
+    conn.execute('DELETE FROM kpi_summary')
+    conn.execute('DELETE FROM kpi_user_refs')
+
+    for column, table, expr in distinct_metrics:
+        conn.execute(f'''
+            INSERT INTO kpi_user_refs (metric, user_id, n)
+            SELECT '{column}', user_id, COUNT(*)
+            FROM "{table}" AS t
+            WHERE {expr.format(r='t')}
+            GROUP BY user_id
+        ''')
+
+    values = [
+        f'(SELECT COALESCE(SUM({_value(expr, "t")}), 0) FROM "{table}" AS t)'
+        for _, table, expr in sum_metrics
+    ] + [
+        f"(SELECT COUNT(*) FROM kpi_user_refs WHERE metric = '{column}' AND n > 0)"
+        for column, _, _ in distinct_metrics
+    ]
+    conn.execute(f'''
+        INSERT INTO kpi_summary (id, {', '.join(m[0] for m in sum_metrics + distinct_metrics)})
+        SELECT 1, {', '.join(values)}
+    ''')
+
+
+def read_kpi_summary(conn):
+    row = conn.execute('SELECT * FROM kpi_summary WHERE id = 1').fetchone()
+    if row is None:
+        rebuild_kpi_summary(conn)
+        conn.commit()
+        row = conn.execute('SELECT * FROM kpi_summary WHERE id = 1').fetchone()
+    return row
@@ -0,0 +1,332 @@
+# Versioned schema migrations.
+#
+# Each database keeps the number of migrations applied to it in
+# PRAGMA user_version. At startup migrate() compares that number with the
+# list below and only runs what is missing, so a current schema costs a
+# single PRAGMA read and no DDL at all. Migrations are append-only: never
+# edit one that has shipped, add a new one instead.
+
+import categories
+import duplicates
+import grading
+import kpi
+import question_search
+import sessions
+import versions
+import write_behind
+from db import table_columns
+
+QUESTIONS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS questions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question_text TEXT NOT NULL,
+        topic TEXT NOT NULL,
+        main_slo TEXT NOT NULL,
+        enabling_slos TEXT NOT NULL,
+        complexity_level TEXT NOT NULL,
+        student_level TEXT NOT NULL,
+        options TEXT NOT NULL,
+        correct_answer TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# Every table that holds one faculty member's records
+PER_USER_TABLES = [
+    'academic_data',
+    'activity_data',
+    'Scientific_production',
+    'Evaluation_aspects',
+    'university_evaluation',
+    'Scientific_research',
+    'participate_conference',
+    'University_Service',
+]
+
+
+def _base_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'user',
+            full_name TEXT
+        )
+    ''')
+    conn.execute(QUESTIONS_TABLE)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS academic_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            semester TEXT NOT NULL,
+            course_code TEXT NOT NULL,
+            num_students INTEGER,
+            teaching_load INTEGER,
+            course_name TEXT,
+            semester_type TEXT,
+            credit_hours INTEGER,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    # Databases created by the old init_db() lack the column semester_data() writes
+    if 'semester_type' not in table_columns(conn, 'academic_data'):
+        conn.execute('ALTER TABLE academic_data ADD COLUMN semester_type TEXT')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS activity_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            activity_title TEXT,
+            activity_date TEXT,
+            duration TEXT,
+            participation_type TEXT,
+            place TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS Scientific_production (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            Scientific_research INTEGER NOT NULL,
+            supervision_Graduation INTEGER NOT NULL,
+            Scientific_sum INTEGER,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            Scientific_research_Evaluation INTEGER,
+            supervision_Graduation_Evaluation INTEGER,
+            evaluation_sum INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS Evaluation_aspects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            Develop_courses INTEGER,
+            Prepare_file INTEGER,
+            Electronic_tests INTEGER,
+            Prepare_material_content INTEGER,
+            Use_learning_effectively INTEGER,
+            teaching_methods INTEGER,
+            Methods_student INTEGER,
+            preparing_test_questions INTEGER,
+            Provide_academic_guidance INTEGER,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            Develop_courses_Evaluation INTEGER,
+            Prepare_file_Evaluation INTEGER,
+            Electronic_tests_Evaluation INTEGER,
+            Prepare_material_Evaluation INTEGER,
+            Use_learning_Evaluation INTEGER,
+            teaching_methods_Evaluation INTEGER,
+            Methods_student_Evaluation INTEGER,
+            preparing_test_Evaluation INTEGER,
+            Provide_academic_Evaluation INTEGER,
+            aspests_sum INTEGER,
+            evaluation_sum INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS university_evaluation (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            department_load INTEGER,
+            workshop_develop INTEGER,
+            program_bank INTEGER,
+            medical_services INTEGER,
+            department_load_Evaluation INTEGER,
+            workshop_develop_Evaluation INTEGER,
+            program_bank_Evaluation INTEGER,
+            medical_services_Evaluation INTEGER,
+            aspects_sum INTEGER,
+            evaluation_sum INTEGER,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS Scientific_research (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            scientific_output TEXT,
+            Authors_names TEXT,
+            Publisher TEXT,
+            Agency TEXT,
+            year TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            research_type TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS participate_conference (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            location TEXT,
+            type_part TEXT,
+            place TEXT,
+            year TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS University_Service (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            task_level TEXT,
+            task_type TEXT,
+            notes TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    # Leftover from editing the schema in DB Browser for SQLite
+    conn.execute('DROP TABLE IF EXISTS sqlb_temp_table_1')
+
+
+def _per_user_indexes(conn):
+    for table in PER_USER_TABLES:
+        # Serves "WHERE user_id = ? ORDER BY created_at DESC" without a sort
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table}_user_created
+            ON "{table}" (user_id, created_at)
+        ''')
+        # Serves the admin listings, which order every user's rows by date
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table}_created
+            ON "{table}" (created_at)
+        ''')
+
+
+# The KPI metrics as _kpi_summary shipped them, research still matched
+# with LIKE over the labels; _category_codes later moved it to the code
+# columns. Frozen here so that migration never changes.
+_KPI_SUM_METRICS_V1 = [
+    ('users_count', 'users', '1'),
+    ('academic_count', 'academic_data', '1'),
+    ('university_service_count', 'University_Service', '1'),
+    ('accepted_research', 'Scientific_research',
+     "{r}.research_type LIKE '%بحث مقبول%' AND {r}.Publisher LIKE '%مؤتمر%'"),
+    ('published_research', 'Scientific_research',
+     "{r}.research_type LIKE '%بحث منشور%' AND {r}.Publisher LIKE '%مجلة%'"),
+    ('evaluation_aspects_total', 'Evaluation_aspects', '{r}.evaluation_sum'),
+    ('evaluation_aspects_n', 'Evaluation_aspects', '{r}.evaluation_sum IS NOT NULL'),
+    ('scientific_production_total', 'Scientific_production', '{r}.evaluation_sum'),
+    ('scientific_production_n', 'Scientific_production', '{r}.evaluation_sum IS NOT NULL'),
+    ('university_evaluation_total', 'university_evaluation', '{r}.evaluation_sum'),
+    ('university_evaluation_n', 'university_evaluation', '{r}.evaluation_sum IS NOT NULL'),
+]
+_KPI_DISTINCT_USER_METRICS_V1 = [
+    ('activity_users', 'activity_data', '1'),
+    ('research_members', 'Scientific_research',
+     "{r}.research_type LIKE '%بحث منشور%' AND {r}.Publisher LIKE '%مجلة%'"),
+    ('conference_users', 'participate_conference', '1'),
+]
+
+
+def _kpi_summary(conn):
+    columns = ',\n'.join(f'{column[0]} INTEGER NOT NULL DEFAULT 0'
+                         for column in _KPI_SUM_METRICS_V1 + _KPI_DISTINCT_USER_METRICS_V1)
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS kpi_summary (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            {columns}
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS kpi_user_refs (
+            metric TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            PRIMARY KEY (metric, user_id)
+        ) WITHOUT ROWID
+    ''')
+    kpi.install_triggers(conn, _KPI_SUM_METRICS_V1, _KPI_DISTINCT_USER_METRICS_V1)
+    kpi.rebuild_kpi_summary(conn, _KPI_SUM_METRICS_V1, _KPI_DISTINCT_USER_METRICS_V1)
+
+
+def _rename_aspects_sum(conn):
+    # Fix the column name the criteria form has always misspelled
+    if 'aspests_sum' in table_columns(conn, 'Evaluation_aspects'):
+        conn.execute('ALTER TABLE Evaluation_aspects RENAME COLUMN aspests_sum TO aspects_sum')
+
+
+def _departments_and_versions(conn):
+    if 'department' not in table_columns(conn, 'users'):
+        conn.execute('ALTER TABLE users ADD COLUMN department TEXT')
+    versions.install_version_triggers(conn, ['users', 'questions'] + PER_USER_TABLES)
+
+
+def _sessions(conn):
+    sessions.create_table(conn)
+
+
+def _question_options(conn):
+    grading.create_table(conn)
+    grading.backfill_options(conn)
+
+
+def _question_duplicates(conn):
+    duplicates.create_tables(conn)
+    duplicates.rebuild_index(conn)
+
+
+def _category_codes(conn):
+    categories.create_tables(conn)
+    categories.classify_rows(conn)
+    # The KPI metrics moved from LIKE over the labels to the codes
+    kpi.install_triggers(conn)
+    kpi.rebuild_kpi_summary(conn)
+
+
+def _write_behind_state(conn):
+    write_behind.create_table(conn)
+
+
+def _user_versions(conn):
+    versions.install_user_version_triggers(conn, PER_USER_TABLES)
+
+
+def _questions_fts(conn):
+    question_search.install_fts(conn)
+
+
+ACADEMIC_MIGRATIONS = [
+    _base_schema,
+    _per_user_indexes,
+    _kpi_summary,
+    _questions_fts,
+    _rename_aspects_sum,
+    _departments_and_versions,
+    _sessions,
+    _question_options,
+    _question_duplicates,
+    _category_codes,
+    _write_behind_state,
+    _user_versions,
+]
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, migrations):
+    if schema_version(conn) >= len(migrations):
+        return
+
+    for version, migration in enumerate(migrations, start=1):
+        # Take the write lock first so two workers starting together cannot
+        # both apply the same migration
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if schema_version(conn) < version:
+                migration(conn)
+                conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
@@ -0,0 +1,57 @@
+# Keyset (cursor) pagination over (created_at, id), newest first.
+#
+# A cursor is the "<id>:<created_at>" of the last row already shown. The
+# next page is everything strictly older than it, which the
+# (created_at) / (user_id, created_at) indexes answer without an OFFSET
+# scan, however deep the admin pages.
+
+
+def make_cursor(row):
+    return f"{row['id']}:{row['created_at']}"
+
+
+def parse_cursor(value):
+    if not value:
+        return None
+    row_id, _, created_at = value.partition(':')
+    try:
+        return created_at, int(row_id)
+    except ValueError:
+        return None
+
+
+def keyset_query(table, cursor=None, user_id=None, limit=None):
+    query = f'''
+        SELECT {table}.*, users.username, users.full_name
+        FROM {table}
+        JOIN users ON {table}.user_id = users.id
+    '''
+    where, params = [], []
+    if user_id is not None:
+        where.append(f'{table}.user_id = ?')
+        params.append(user_id)
+    if cursor is not None:
+        where.append(f'({table}.created_at, {table}.id) < (?, ?)')
+        params.extend(cursor)
+    if where:
+        query += ' WHERE ' + ' AND '.join(where)
+    query += f' ORDER BY {table}.created_at DESC, {table}.id DESC'
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+    return query, params
+
+
+def fetch_page(conn, table, cursor=None, user_id=None, page_size=50):
+    # Ask for one extra row to learn whether another page follows
+    query, params = keyset_query(table, cursor, user_id, page_size + 1)
+    rows = conn.execute(query, params).fetchall()
+    next_cursor = make_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+
+def iter_rows(conn, table, user_id=None):
+    # Lazily walk the whole listing; the cursor is consumed row by row as
+    # the template renders, so nothing is buffered
+    query, params = keyset_query(table, user_id=user_id)
+    return conn.execute(query, params)
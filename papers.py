@@ -0,0 +1,156 @@
+# Exam paper generation.
+#
+# The question bank is indexed once into per-stratum id lists keyed by
+# (student level, complexity, topic, main SLO); the index is rebuilt only
+# when the questions table changes (see versions.py). A paper request
+# fixes how many questions of each complexity it wants; each quota is
+# spread round-robin over the matching topic/SLO strata so every requested
+# SLO is covered. Every stratum is dealt from a shuffled deck, so no
+# question repeats within a call, across all of its variants, until the
+# deck runs out. Sampling never touches SQLite, so hundreds of variants
+# cost a few list lookups each instead of an ORDER BY RANDOM() scan apiece.
+import json
+import random
+import threading
+
+from versions import table_versions
+
+COMPLEXITY_LEVELS = ['K1', 'K2', 'K3', 'K4']
+# The choices of the question form
+STUDENT_LEVELS = ['UG', 'PG', 'Resident']
+MAX_VARIANTS = 500
+MAX_QUESTIONS = 200
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class PaperSpecError(ValueError):
+    pass
+
+
+def build_index(conn):
+    # {(student_level, complexity_level, topic, main_slo): [question id, ...]}
+    strata = {}
+    for row in conn.execute('''
+        SELECT id, student_level, complexity_level, topic, main_slo FROM questions ORDER BY id
+    '''):
+        strata.setdefault(tuple(row[1:]), []).append(row[0])
+    return strata
+
+
+def question_index(conn, database):
+    versions = table_versions(conn, ['questions'])
+    with _cache_lock:
+        cached = _cache.get(database)
+        if cached and cached[0] == versions:
+            return cached[1]
+    strata = build_index(conn)
+    with _cache_lock:
+        _cache[database] = (versions, strata)
+    return strata
+
+
+def complexity_quotas(count, mix):
+    # Turn {'K3': 0.3, ...} (fractions or percentages) into whole numbers
+    # of questions that add up to count, by largest remainder. Levels left
+    # out of the mix share what the listed ones do not claim.
+    if not mix:
+        mix = {level: 1 for level in COMPLEXITY_LEVELS}
+    unknown = set(mix) - set(COMPLEXITY_LEVELS)
+    if unknown:
+        raise PaperSpecError(f'unknown complexity levels: {", ".join(sorted(unknown))}')
+    if not all(isinstance(share, (int, float)) for share in mix.values()):
+        raise PaperSpecError('complexity shares must be numbers')
+    total = sum(mix.values())
+    if total <= 0 or any(share < 0 for share in mix.values()):
+        raise PaperSpecError('complexity shares must be positive')
+
+    exact = {level: count * share / total for level, share in mix.items()}
+    quotas = {level: int(value) for level, value in exact.items()}
+    leftover = count - sum(quotas.values())
+    for level in sorted(exact, key=lambda level: exact[level] - quotas[level], reverse=True)[:leftover]:
+        quotas[level] += 1
+    return {level: quota for level, quota in quotas.items() if quota}
+
+
+class _Deck:
+    # A stratum's ids in random order, dealt without replacement; when it
+    # runs out it is reshuffled and repeats begin
+    def __init__(self, ids, rng):
+        self.ids = list(ids)
+        self.rng = rng
+        self.rng.shuffle(self.ids)
+        self.position = 0
+        self.reshuffles = 0
+
+    def deal(self, taken):
+        # Next id not already on the paper being built, or None
+        for _ in range(2):
+            while self.position < len(self.ids):
+                question_id = self.ids[self.position]
+                self.position += 1
+                if question_id not in taken:
+                    return question_id
+            self.rng.shuffle(self.ids)
+            self.position = 0
+            self.reshuffles += 1
+        return None
+
+
+def generate_papers(strata, count, mix=None, level=None, topics=None, slos=None, variants=1, seed=None):
+    if not 0 < count <= MAX_QUESTIONS:
+        raise PaperSpecError(f'count must be between 1 and {MAX_QUESTIONS}')
+    if not 0 < variants <= MAX_VARIANTS:
+        raise PaperSpecError(f'variants must be between 1 and {MAX_VARIANTS}')
+    quotas = complexity_quotas(count, mix)
+    topics = set(topics) if topics else None
+    slos = set(slos) if slos else None
+
+    rng = random.Random(seed)
+    decks = {}
+    for complexity in quotas:
+        keys = [key for key in strata
+                if key[1] == complexity
+                and (level is None or key[0] == level)
+                and (topics is None or key[2] in topics)
+                and (slos is None or key[3] in slos)]
+        available = sum(len(strata[key]) for key in keys)
+        if available < quotas[complexity]:
+            raise PaperSpecError(
+                f'{quotas[complexity]} {complexity} questions requested but only {available} match')
+        decks[complexity] = [_Deck(strata[key], rng) for key in sorted(keys)]
+
+    papers = []
+    for number in range(1, variants + 1):
+        taken = set()
+        for complexity, quota in quotas.items():
+            complexity_decks = decks[complexity]
+            # Start each variant at a different stratum so small quotas
+            # still rotate through all the requested SLOs
+            start = rng.randrange(len(complexity_decks))
+            dealt, turn, misses = 0, start, 0
+            while dealt < quota and misses < len(complexity_decks):
+                question_id = complexity_decks[turn % len(complexity_decks)].deal(taken)
+                turn += 1
+                if question_id is None:
+                    misses += 1
+                    continue
+                taken.add(question_id)
+                dealt += 1
+                misses = 0
+        order = list(taken)
+        rng.shuffle(order)
+        papers.append({'variant': number, 'questions': order})
+
+    # True once any stratum ran dry and questions began to recur across variants
+    repeated = any(deck.reshuffles for complexity_decks in decks.values() for deck in complexity_decks)
+    return {'variants': papers, 'quotas': quotas, 'repeated': repeated}
+
+
+def fetch_questions(conn, ids):
+    rows = conn.execute('''
+        SELECT id, question_text, topic, main_slo, complexity_level, student_level, options
+        FROM questions WHERE id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(list(ids)),)).fetchall()
+    return {row['id']: dict(row) for row in rows}
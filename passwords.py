@@ -0,0 +1,102 @@
+# Password hashing off the request threads.
+#
+# Hashes are computed on a small process pool, so a burst of logins at the
+# start of an evaluation window occupies at most PASSWORD_HASH_WORKERS
+# cores instead of stalling every request thread of the worker. At most
+# PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE hashes are in flight; beyond
+# that a caller waits up to PASSWORD_HASH_WAIT seconds for a slot and then
+# gets HashingBusy, which the views turn into a "try again" answer.
+#
+# PASSWORD_HASH_METHOD takes any werkzeug method string, e.g. 'scrypt',
+# 'scrypt:65536:8:1' or 'pbkdf2:sha256:1000000'. Hashes made with other
+# parameters keep working and are replaced on the user's next login.
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_CONFIG = {
+    'PASSWORD_HASH_METHOD': 'scrypt',
+    'PASSWORD_HASH_WORKERS': 2,         # 0 hashes on the calling thread
+    'PASSWORD_HASH_QUEUE': 16,
+    'PASSWORD_HASH_WAIT': 5,            # seconds
+}
+
+_config = dict(DEFAULT_CONFIG)
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(DEFAULT_CONFIG['PASSWORD_HASH_WORKERS'] + DEFAULT_CONFIG['PASSWORD_HASH_QUEUE'])
+_canonical_methods = {}
+
+
+class HashingBusy(RuntimeError):
+    pass
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn rather than fork: the app process has threads and open
+            # SQLite connections that must not be copied into the workers
+            _pool = ProcessPoolExecutor(
+                max_workers=_config['PASSWORD_HASH_WORKERS'],
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def _run(function, *args):
+    if not _config['PASSWORD_HASH_WORKERS']:
+        return function(*args)
+    if not _slots.acquire(timeout=_config['PASSWORD_HASH_WAIT']):
+        raise HashingBusy('too many password checks in progress')
+    try:
+        future = _get_pool().submit(function, *args)
+    except BrokenProcessPool:
+        _slots.release()
+        shutdown()
+        raise
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, _config['PASSWORD_HASH_METHOD'])
+
+
+def verify_password(pwhash, password):
+    return _run(check_password_hash, pwhash, password)
+
+
+def _canonical(method):
+    # werkzeug fills in defaults ('scrypt' -> 'scrypt:32768:8:1'); hashing
+    # an empty password once tells what a method string expands to
+    if method not in _canonical_methods:
+        _canonical_methods[method] = generate_password_hash('', method).split('$', 1)[0]
+    return _canonical_methods[method]
+
+
+def needs_rehash(pwhash):
+    return pwhash.split('$', 1)[0] != _canonical(_config['PASSWORD_HASH_METHOD'])
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def init_app(app):
+    global _slots
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+    _config.update({key: app.config[key] for key in DEFAULT_CONFIG})
+    _slots = threading.BoundedSemaphore(_config['PASSWORD_HASH_WORKERS'] + _config['PASSWORD_HASH_QUEUE'])
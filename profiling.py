@@ -0,0 +1,194 @@
+# Opt-in request profiling (PROFILING = True).
+#
+# Every request records its wall time, the number and duration of the SQL
+# statements it ran and the time spent rendering templates. Totals per
+# endpoint are served in Prometheus text format at /metrics, to admins
+# only, and requests slower than PROFILING_SLOW_MS are written to the
+# slow-request log with their slowest statements. Timing stops when the
+# response is closed, so streamed pages and exports are measured in full.
+import logging
+import sqlite3
+import threading
+import time
+
+from flask import Response, before_render_template, current_app, g, request, template_rendered
+
+from auth import admin_required
+
+DEFAULT_CONFIG = {
+    'PROFILING': False,
+    'PROFILING_SLOW_MS': 500,
+    'PROFILING_SLOW_LOG': None,         # file path; stderr when unset
+    'PROFILING_SLOW_QUERIES': 5,        # statements listed per slow request
+}
+
+# Upper bounds, in seconds, of the request duration histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+slow_log = logging.getLogger('profiling.slow')
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class ProfiledConnection(sqlite3.Connection):
+    # Times every statement run through the connection and charges it to
+    # the current request. Outside a request (init_db, CLI commands) the
+    # statements run untimed.
+    def _timed(self, method, sql, *args):
+        profile = g.get('_profile') if g else None
+        if profile is None:
+            return method(sql, *args)
+        start = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            profile['queries'].append((time.perf_counter() - start, sql))
+
+    def execute(self, sql, *args):
+        return self._timed(super().execute, sql, *args)
+
+    def executemany(self, sql, *args):
+        return self._timed(super().executemany, sql, *args)
+
+    def executescript(self, sql):
+        return self._timed(super().executescript, sql)
+
+
+def _endpoint_stats(endpoint):
+    stats = _stats.get(endpoint)
+    if stats is None:
+        stats = _stats[endpoint] = {
+            'requests': 0,
+            'seconds': 0.0,
+            'buckets': [0] * len(BUCKETS),
+            'statuses': {},
+            'queries': 0,
+            'sql_seconds': 0.0,
+            'templates': 0,
+            'template_seconds': 0.0,
+        }
+    return stats
+
+
+def _start_request():
+    g._profile = {'start': time.perf_counter(), 'queries': [], 'templates': [], 'rendering': []}
+
+
+def _before_render(sender, template, context, **extra):
+    profile = g.get('_profile')
+    if profile is not None:
+        profile['rendering'].append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    profile = g.get('_profile')
+    if profile is not None and profile['rendering']:
+        profile['templates'].append(time.perf_counter() - profile['rendering'].pop())
+
+
+def _finish_request(response):
+    # Left in g: statements a streamed body runs later still count
+    profile = g.get('_profile')
+    if profile is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    method, path, status = request.method, request.full_path.rstrip('?'), response.status_code
+    slow_ms = current_app.config['PROFILING_SLOW_MS']
+    slow_queries = current_app.config['PROFILING_SLOW_QUERIES']
+
+    def record():
+        elapsed = time.perf_counter() - profile['start']
+        sql_seconds = sum(duration for duration, _ in profile['queries'])
+        template_seconds = sum(profile['templates'])
+        with _stats_lock:
+            stats = _endpoint_stats(endpoint)
+            stats['requests'] += 1
+            stats['seconds'] += elapsed
+            for i, bound in enumerate(BUCKETS):
+                if elapsed <= bound:
+                    stats['buckets'][i] += 1
+            stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+            stats['queries'] += len(profile['queries'])
+            stats['sql_seconds'] += sql_seconds
+            stats['templates'] += len(profile['templates'])
+            stats['template_seconds'] += template_seconds
+
+        if elapsed * 1000 >= slow_ms:
+            slowest = sorted(profile['queries'], key=lambda query: query[0], reverse=True)[:slow_queries]
+            slow_log.warning(
+                'slow request %s %s (%s) %d: %.1f ms, %d queries in %.1f ms, templates %.1f ms%s',
+                method, path, endpoint, status, elapsed * 1000,
+                len(profile['queries']), sql_seconds * 1000, template_seconds * 1000,
+                ''.join(f'\n    {duration * 1000:8.2f} ms  {" ".join(sql.split())}'
+                        for duration, sql in slowest),
+            )
+
+    response.call_on_close(record)
+    return response
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def render_metrics():
+    with _stats_lock:
+        snapshot = {endpoint: dict(stats, buckets=list(stats['buckets']), statuses=dict(stats['statuses']))
+                    for endpoint, stats in _stats.items()}
+
+    lines = [
+        '# HELP http_request_duration_seconds Wall time per request, until the response is closed.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for endpoint, stats in sorted(snapshot.items()):
+        label = f'endpoint="{_label(endpoint)}"'
+        for bound, count in zip(BUCKETS, stats['buckets']):
+            lines.append(f'http_request_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+        lines.append(f'http_request_duration_seconds_bucket{{{label},le="+Inf"}} {stats["requests"]}')
+        lines.append(f'http_request_duration_seconds_sum{{{label}}} {stats["seconds"]:.6f}')
+        lines.append(f'http_request_duration_seconds_count{{{label}}} {stats["requests"]}')
+
+    metrics = [
+        ('http_responses_total', 'counter', 'Responses by endpoint and status code.', None),
+        ('sql_queries_total', 'counter', 'SQL statements executed.', 'queries'),
+        ('sql_duration_seconds_total', 'counter', 'Time spent executing SQL statements.', 'sql_seconds'),
+        ('template_renders_total', 'counter', 'Templates rendered.', 'templates'),
+        ('template_render_seconds_total', 'counter', 'Time spent rendering templates.', 'template_seconds'),
+    ]
+    for name, kind, help_text, key in metrics:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for endpoint, stats in sorted(snapshot.items()):
+            label = f'endpoint="{_label(endpoint)}"'
+            if key is None:
+                for status, count in sorted(stats['statuses'].items()):
+                    lines.append(f'{name}{{{label},status="{status}"}} {count}')
+            elif isinstance(stats[key], float):
+                lines.append(f'{name}{{{label}}} {stats[key]:.6f}')
+            else:
+                lines.append(f'{name}{{{label}}} {stats[key]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+    if not app.config['PROFILING']:
+        return
+    # db._connect builds every pooled connection from this factory
+    app.config['SQLITE_CONNECTION_FACTORY'] = ProfiledConnection
+    if app.config['PROFILING_SLOW_LOG']:
+        handler = logging.FileHandler(app.config['PROFILING_SLOW_LOG'], encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        slow_log.addHandler(handler)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    app.add_url_rule('/metrics', 'metrics', admin_required(metrics))
@@ -0,0 +1,307 @@
+# Question bank: authoring, search, paper generation, grading and
+# duplicate detection, served by the main app from academic.db.
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, abort, jsonify
+import click
+from auth import login_required, admin_required
+from http_cache import cached_view
+from db import get_db
+import duplicates
+import grading
+import question_search
+from papers import PaperSpecError, fetch_questions, generate_papers, question_index
+
+bp = Blueprint('questions', __name__, cli_group=None)
+
+@bp.route('/add_Q', methods=['GET', 'POST'])
+# The address the standalone question app used
+@bp.route('/add', methods=['GET', 'POST'])
+def add_question():
+    if request.method == 'POST':
+        # Get form data
+        topic = request.form['topic'].strip()
+        main_slo = request.form['main_slo'].strip()
+        enabling_slos = request.form['enabling_slos'].strip()
+        complexity = request.form['complexity'].strip()
+        student_level = request.form['student_level'].strip()
+        question_text = request.form['question_text'].strip()
+        options = request.form['options'].strip()
+        correct_answer = request.form['correct_answer'].strip().upper()
+
+        # Validate inputs
+        if not all([topic, main_slo, complexity, student_level, question_text, options, correct_answer]):
+            flash('All fields are required!', 'error')
+            return render_template('add_question.html', form_data=request.form)
+
+        # Process options and validate correct answer
+        try:
+            options_list = grading.parse_options(options)
+            grading.check_answer(options_list, correct_answer)
+        except ValueError as e:
+            flash(str(e), 'error')
+            return render_template('add_question.html', form_data=request.form)
+        options = grading.format_options(options_list)
+
+        # Likely rewordings of existing questions are shown to the author,
+        # who has to confirm before the question is added
+        conn = get_db()
+        similar = duplicates.find_duplicates(conn, question_text)
+        if similar and not request.form.get('confirm_duplicate'):
+            flash('This question looks like one already in the bank.', 'warning')
+            return render_template('add_question.html', form_data=request.form, duplicates=similar)
+
+        # Save to database
+        try:
+            cursor = conn.execute('''
+                INSERT INTO questions (
+                    question_text, topic, main_slo, enabling_slos, 
+                    complexity_level, student_level, options, correct_answer
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                question_text, topic, main_slo, enabling_slos, 
+                complexity, student_level, options, correct_answer
+            ))
+            grading.save_options(conn, cursor.lastrowid, options_list)
+            duplicates.index_question(conn, cursor.lastrowid, question_text)
+            conn.commit()
+            
+            flash('Question added successfully!', 'success')
+            return redirect(url_for('.add_question'))
+            
+        except Exception as e:
+            flash(f'Failed to add question: {str(e)}', 'error')
+    
+    return render_template('add_question.html')
+
+@bp.route('/search', methods=['GET', 'POST'])
+def search_questions():
+    if request.method == 'POST':
+        search_term = request.form.get('search_term', '').strip()
+        complexity = request.form.get('complexity', '').strip()
+
+        # Ranked full-text search, see question_search.py
+        questions = question_search.search_questions(get_db(), search_term, complexity)
+        
+        return render_template('search.html', questions=questions, search_term=search_term, complexity=complexity)
+    
+    return render_template('search.html')
+
+@bp.route('/api/papers', methods=['POST'])
+@login_required
+def generate_papers_api():
+    # {"count": 40, "complexity": {"K3": 30, "K2": 50, "K1": 20}, "level": "UG",
+    #  "slos": [...], "topics": [...], "variants": 100, "seed": 7,
+    #  "include_questions": false}
+    spec = request.get_json(silent=True) or {}
+    try:
+        result = generate_papers(
+            question_index(get_db(), current_app.config['DATABASE']),
+            int(spec.get('count', 0)),
+            mix=spec.get('complexity'),
+            level=spec.get('level') or None,
+            topics=spec.get('topics'),
+            slos=spec.get('slos'),
+            variants=int(spec.get('variants', 1)),
+            seed=spec.get('seed'),
+        )
+    except (PaperSpecError, TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    if spec.get('include_questions'):
+        ids = {question_id for paper in result['variants'] for question_id in paper['questions']}
+        result['questions'] = fetch_questions(get_db(), ids)
+    return jsonify(result)
+
+@bp.route('/api/grade', methods=['POST'])
+@login_required
+def grade_api():
+    # {"questions": [ids on the paper, optional],
+    #  "sheets": [{"student": "...", "answers": {"<question id>": "B", ...}}, ...]}
+    payload = request.get_json(silent=True) or {}
+    sheets = payload.get('sheets')
+    if not isinstance(sheets, list):
+        return jsonify({'error': 'expected {"sheets": [{"student": ..., "answers": {...}}, ...]}'}), 400
+    try:
+        questions = [int(question_id) for question_id in payload['questions']] if payload.get('questions') else None
+        ids = set(questions or [])
+        for sheet in sheets:
+            ids.update(int(question_id) for question_id in (sheet.get('answers') or {}))
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({'error': 'question ids must be whole numbers'}), 400
+
+    key = grading.answer_key(get_db(), current_app.config['DATABASE'], list(ids))
+    results = grading.grade_sheets(key, sheets, questions)
+    return jsonify({'graded': len(results), 'results': results})
+
+@bp.route('/admin/duplicates')
+@login_required
+@admin_required
+def duplicate_report():
+    conn = get_db()
+    clusters = duplicates.duplicate_clusters(conn)
+    ids = [question_id for cluster in clusters for question_id in cluster]
+    questions = {}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        questions.update((row['id'], row) for row in conn.execute(f'''
+            SELECT id, question_text, topic, main_slo, complexity_level FROM questions
+            WHERE id IN ({', '.join('?' * len(chunk))})
+        ''', chunk))
+    return render_template('admin/duplicates.html', clusters=clusters, questions=questions)
+
+@bp.cli.command('rebuild-duplicates-index')
+def rebuild_duplicates_index_command():
+    """Re-index every question for duplicate detection, e.g. after a bulk load."""
+    conn = get_db()
+    duplicates.rebuild_index(conn)
+    conn.commit()
+
+@bp.route('/view_all')
+@cached_view(['questions'])
+def view_all():
+    conn = get_db()
+    questions = conn.execute('''
+        SELECT id, topic, main_slo, complexity_level, student_level, 
+               strftime('%Y-%m-%d', created_at) as created_at
+        FROM questions 
+        ORDER BY id DESC
+    ''').fetchall()
+    return render_template('view_all.html', questions=questions)
+
+@bp.route('/question/<int:question_id>')
+@cached_view(['questions'])
+def question_detail(question_id):
+    conn = get_db()
+    question = conn.execute('''
+        SELECT *
+        FROM questions 
+        WHERE id = ?
+    ''', (question_id,)).fetchone()
+    
+    if question is None:
+        abort(404)
+    
+    return render_template('question_detail.html', question=question,
+                           options=grading.load_options(conn, question_id))
+
+@bp.route('/edit/<int:question_id>', methods=['GET', 'POST'])
+def edit_question(question_id):
+    conn = get_db()
+    
+    if request.method == 'POST':
+        # Get form data
+        topic = request.form['topic'].strip()
+        main_slo = request.form['main_slo'].strip()
+        enabling_slos = request.form['enabling_slos'].strip()
+        complexity = request.form['complexity'].strip()
+        student_level = request.form['student_level'].strip()
+        question_text = request.form['question_text'].strip()
+        options = request.form['options'].strip()
+        correct_answer = request.form['correct_answer'].strip().upper()
+
+        # Validate inputs
+        if not all([topic, main_slo, complexity, student_level, question_text, options, correct_answer]):
+            flash('All fields are required!', 'error')
+            return render_template('edit_question.html', question=request.form)
+
+        # Process options and validate correct answer
+        try:
+            options_list = grading.parse_options(options)
+            grading.check_answer(options_list, correct_answer)
+        except ValueError as e:
+            flash(str(e), 'error')
+            return render_template('edit_question.html', question=request.form)
+        options = grading.format_options(options_list)
+
+        # Update database
+        try:
+            conn.execute('''
+                UPDATE questions SET
+                    question_text = ?,
+                    topic = ?,
+                    main_slo = ?,
+                    enabling_slos = ?,
+                    complexity_level = ?,
+                    student_level = ?,
+                    options = ?,
+                    correct_answer = ?
+                WHERE id = ?
+            ''', (
+                question_text, topic, main_slo, enabling_slos, 
+                complexity, student_level, options, correct_answer,
+                question_id
+            ))
+            grading.save_options(conn, question_id, options_list)
+            duplicates.index_question(conn, question_id, question_text)
+            conn.commit()
+            
+            flash('Question updated successfully!', 'success')
+            similar = duplicates.find_duplicates(conn, question_text, exclude=question_id)
+            if similar:
+                flash('This question looks like ' + ', '.join(f"#{question['id']}" for question in similar) + '.', 'warning')
+            return redirect(url_for('.question_detail', question_id=question_id))
+            
+        except Exception as e:
+            flash(f'Failed to update question: {str(e)}', 'error')
+    
+    # GET request - load existing question
+    question = conn.execute('''
+        SELECT *
+        FROM questions 
+        WHERE id = ?
+    ''', (question_id,)).fetchone()
+    
+    if question is None:
+        abort(404)
+    
+    return render_template('edit_question.html', question=question)
+
+@bp.route('/delete/<int:question_id>', methods=['POST'])
+def delete_question(question_id):
+    conn = get_db()
+    conn.execute('DELETE FROM questions WHERE id = ?', (question_id,))
+    conn.commit()
+    
+    flash('Question deleted successfully!', 'success')
+    return redirect(url_for('.view_all'))
+
+def merge_question_store(conn, path):
+    # Copy the questions of a standalone questions.db into this database.
+    # Questions already here (same text, options and answer) are skipped,
+    # so merging the same file twice adds nothing. Returns (added, skipped).
+    existing = {tuple(row) for row in conn.execute('SELECT question_text, options, correct_answer FROM questions')}
+    conn.execute('ATTACH DATABASE ? AS merged', (path,))
+    try:
+        rows = conn.execute('''
+            SELECT question_text, topic, main_slo, enabling_slos, complexity_level,
+                   student_level, options, correct_answer, created_at
+            FROM merged.questions ORDER BY id
+        ''').fetchall()
+        added = 0
+        with conn:
+            for row in rows:
+                key = (row['question_text'], row['options'], row['correct_answer'])
+                if key in existing:
+                    continue
+                existing.add(key)
+                cursor = conn.execute('''
+                    INSERT INTO questions (
+                        question_text, topic, main_slo, enabling_slos,
+                        complexity_level, student_level, options, correct_answer, created_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', tuple(row))
+                try:
+                    grading.save_options(conn, cursor.lastrowid, grading.parse_options(row['options']))
+                except ValueError:
+                    pass
+                duplicates.index_question(conn, cursor.lastrowid, row['question_text'])
+                added += 1
+    finally:
+        conn.execute('DETACH DATABASE merged')
+    return added, len(rows) - added
+
+@bp.cli.command('merge-questions')
+@click.argument('path', default='questions.db', type=click.Path(exists=True, dir_okay=False))
+def merge_questions_command(path):
+    """Merge the old question app's questions.db into the main database."""
+    added, skipped = merge_question_store(get_db(), path)
+    click.echo(f'Merged {added} questions, skipped {skipped} already present.')
@@ -0,0 +1,150 @@
+# Full-text search over the question bank.
+#
+# questions_fts is an FTS5 index keyed by question id that stores a
+# normalized copy of the searchable columns. Triggers on questions keep it
+# in sync, applying the same Arabic folding in SQL that normalize_arabic()
+# applies to search terms, so "أسئلة", "اسئله" and "أَسْئِلَة" all match.
+import re
+from markupsafe import Markup, escape
+
+FTS_COLUMNS = ['question_text', 'topic', 'main_slo', 'enabling_slos']
+
+# BM25 weight per column, in FTS_COLUMNS order
+FTS_WEIGHTS = [3.0, 2.0, 1.5, 1.0]
+
+# Hamza carriers and alef variants fold to their base letter, taa marbuta
+# to haa, alef maqsura to yaa
+ARABIC_FOLDING = {
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و', 'ئ': 'ي', 'ى': 'ي', 'ة': 'ه',
+}
+# Harakat, tanween, shadda, sukun, superscript alef and tatweel are dropped
+ARABIC_STRIPPED = [chr(c) for c in range(0x064B, 0x0653)] + ['ٰ', 'ـ']
+
+_TRANSLATION = str.maketrans({**ARABIC_FOLDING, **{c: None for c in ARABIC_STRIPPED}})
+
+# A word in the original text, diacritics included
+_WORD = re.compile('[\\w' + ''.join(ARABIC_STRIPPED) + ']+')
+
+
+def normalize_arabic(text):
+    return (text or '').translate(_TRANSLATION).lower()
+
+
+def normalize_sql(expr):
+    # The SQL twin of normalize_arabic(), for use inside triggers
+    for char, replacement in ARABIC_FOLDING.items():
+        expr = f"replace({expr}, '{char}', '{replacement}')"
+    for char in ARABIC_STRIPPED:
+        expr = f"replace({expr}, '{char}', '')"
+    return f'lower({expr})'
+
+
+def install_fts(conn):
+    conn.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+            {', '.join(FTS_COLUMNS)},
+            tokenize = 'unicode61'
+        )
+    ''')
+
+    def normalized(row):
+        return ', '.join(normalize_sql(f'{row}.{column}') for column in FTS_COLUMNS)
+
+    insert = f'''
+        INSERT INTO questions_fts (rowid, {', '.join(FTS_COLUMNS)})
+        VALUES (NEW.id, {normalized('NEW')});
+    '''
+    delete = 'DELETE FROM questions_fts WHERE rowid = OLD.id;'
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS questions_fts_insert AFTER INSERT ON questions
+        BEGIN {insert} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS questions_fts_update AFTER UPDATE ON questions
+        BEGIN {delete} {insert} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS questions_fts_delete AFTER DELETE ON questions
+        BEGIN {delete} END
+    ''')
+
+    conn.execute('DELETE FROM questions_fts')
+    conn.execute(f'''
+        INSERT INTO questions_fts (rowid, {', '.join(FTS_COLUMNS)})
+        SELECT id, {normalized('questions')} FROM questions
+    ''')
+
+
+def search_words(search_term):
+    return re.findall(r'\w+', normalize_arabic(search_term))
+
+
+def fts_query(words):
+    # Every word must match, each as a prefix; quoting keeps user input from
+    # being read as FTS5 syntax
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def highlight(text, words, size=24):
+    # Snippet of the original (unnormalized) text around the first match,
+    # with every word the query matched wrapped in <mark>
+    tokens = list(_WORD.finditer(text))
+    hits = [i for i, token in enumerate(tokens)
+            if any(normalize_arabic(token.group()).startswith(word) for word in words)]
+    start = max(hits[0] - size // 4, 0) if hits else 0
+    window = tokens[start:start + size]
+    if not window:
+        return escape(text[:100])
+
+    hit_set = set(hits)
+    parts = ['…' if start else '']
+    position = window[0].start()
+    for i, token in enumerate(window, start=start):
+        parts.append(escape(text[position:token.start()]))
+        word = escape(token.group())
+        parts.append(Markup(f'<mark>{word}</mark>') if i in hit_set else word)
+        position = token.end()
+    if start + size < len(tokens):
+        parts.append('…')
+    else:
+        parts.append(escape(text[position:]))
+    return Markup('').join(parts)
+
+
+def search_questions(conn, search_term='', complexity='', limit=200):
+    words = search_words(search_term)
+    match = fts_query(words)
+    params = []
+
+    if match:
+        query = '''
+            SELECT questions.id, questions.topic, questions.main_slo,
+                   questions.complexity_level, questions.question_text
+            FROM questions_fts
+            JOIN questions ON questions.id = questions_fts.rowid
+            WHERE questions_fts MATCH ?
+        '''
+        params.append(match)
+    else:
+        query = '''
+            SELECT id, topic, main_slo, complexity_level, question_text
+            FROM questions
+            WHERE 1=1
+        '''
+
+    if complexity:
+        query += ' AND questions.complexity_level = ?'
+        params.append(complexity)
+
+    if match:
+        query += f" ORDER BY bm25(questions_fts, {', '.join(map(str, FTS_WEIGHTS))})"
+    else:
+        query += ' ORDER BY id DESC'
+    query += ' LIMIT ?'
+    params.append(limit)
+
+    return [
+        dict(row, snippet=highlight(row['question_text'], words))
+        for row in conn.execute(query, params)
+    ]
@@ -0,0 +1,153 @@
+# Faculty scoring and ranking.
+#
+# Loads the evaluation totals of all three evaluation tables as NumPy
+# columns and computes, in one vectorized pass over every faculty member:
+# the weighted composite score, its z-score, the percentile rank and the
+# rank within the member's department. Results are cached per database
+# and term until one of the source tables changes (see versions.py).
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # scoring is optional; the rest of the app runs without NumPy
+    np = None
+
+from db import year_range
+from versions import table_versions
+
+# (table, weight, highest possible evaluation_sum). Each component is
+# scaled by its maximum before weighting so the composite is out of 100.
+SCORE_COMPONENTS = [
+    ('Evaluation_aspects', 0.5, 45),
+    ('Scientific_production', 0.25, 10),
+    ('university_evaluation', 0.25, 20),
+]
+
+SOURCE_TABLES = ['users'] + [component[0] for component in SCORE_COMPONENTS]
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class ScoringUnavailable(RuntimeError):
+    pass
+
+
+def _term_filter(year):
+    if year is None:
+        return '', []
+    return ' AND created_at >= ? AND created_at < ?', list(year_range(year))
+
+
+def _component_means(conn, table, user_index, year):
+    # Mean evaluation_sum per user (a user may have several evaluated rows),
+    # NaN for users never evaluated
+    where, params = _term_filter(year)
+    rows = conn.execute(f'''
+        SELECT user_id, evaluation_sum FROM {table}
+        WHERE evaluation_sum IS NOT NULL{where}
+    ''', params).fetchall()
+    means = np.full(len(user_index), np.nan)
+    if not rows:
+        return means
+
+    data = np.array(rows, dtype=float)
+    positions = np.searchsorted(user_index, data[:, 0])
+    positions = np.clip(positions, 0, len(user_index) - 1)
+    known = user_index[positions] == data[:, 0]
+    positions, values = positions[known], data[known, 1]
+
+    totals = np.bincount(positions, weights=values, minlength=len(user_index))
+    counts = np.bincount(positions, minlength=len(user_index))
+    evaluated = counts > 0
+    means[evaluated] = totals[evaluated] / counts[evaluated]
+    return means
+
+
+def _department_ranks(departments, scores):
+    # Competition ranking ("1, 2, 2, 4") of scores within each department
+    order = np.lexsort((-scores, departments))
+    sorted_departments = departments[order]
+    sorted_scores = scores[order]
+    positions = np.arange(len(order))
+
+    new_department = np.ones(len(order), dtype=bool)
+    new_department[1:] = sorted_departments[1:] != sorted_departments[:-1]
+    new_score = new_department.copy()
+    new_score[1:] |= sorted_scores[1:] != sorted_scores[:-1]
+
+    department_start = np.maximum.accumulate(np.where(new_department, positions, 0))
+    tie_start = np.maximum.accumulate(np.where(new_score, positions, 0))
+
+    ranks = np.empty(len(order), dtype=int)
+    ranks[order] = tie_start - department_start + 1
+    return ranks
+
+
+def compute_scores(conn, year=None):
+    if np is None:
+        raise ScoringUnavailable('Faculty scoring needs the numpy package')
+
+    users = conn.execute('''
+        SELECT id, username, full_name, COALESCE(department, '') AS department
+        FROM users WHERE role != 'admin' ORDER BY id
+    ''').fetchall()
+    if not users:
+        return []
+
+    user_index = np.array([user['id'] for user in users], dtype=float)
+    components = np.column_stack([
+        _component_means(conn, table, user_index, year) for table, _, _ in SCORE_COMPONENTS
+    ])
+    weights = np.array([weight for _, weight, _ in SCORE_COMPONENTS])
+    maxima = np.array([maximum for _, _, maximum in SCORE_COMPONENTS], dtype=float)
+
+    # Missing evaluations count as zero towards the composite
+    scaled = np.nan_to_num(components / maxima)
+    # Rounded so that equal scores tie exactly in the rankings below
+    totals = np.round(scaled @ weights / weights.sum() * 100, 2)
+
+    std = totals.std()
+    z_scores = (totals - totals.mean()) / std if std else np.zeros(len(totals))
+
+    ordered = np.sort(totals)
+    below = np.searchsorted(ordered, totals, side='left')
+    equal = np.searchsorted(ordered, totals, side='right') - below
+    percentiles = (below + 0.5 * equal) / len(totals) * 100
+
+    _, department_codes = np.unique([user['department'] for user in users], return_inverse=True)
+    department_ranks = _department_ranks(department_codes, totals)
+
+    results = []
+    for i, user in enumerate(users):
+        results.append({
+            'user_id': user['id'],
+            'username': user['username'],
+            'full_name': user['full_name'],
+            'department': user['department'],
+            'components': {
+                table: (None if np.isnan(components[i, j]) else round(float(components[i, j]), 2))
+                for j, (table, _, _) in enumerate(SCORE_COMPONENTS)
+            },
+            'total': float(totals[i]),
+            'z_score': round(float(z_scores[i]), 3),
+            'percentile': round(float(percentiles[i]), 1),
+            'department_rank': int(department_ranks[i]),
+        })
+    results.sort(key=lambda result: (-result['total'], result['user_id']))
+    return results
+
+
+def faculty_scores(conn, database, year=None):
+    # Cached compute_scores(): recomputed only when a source table changed
+    versions = table_versions(conn, SOURCE_TABLES)
+    key = (database, year)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached and cached[0] == versions:
+            return cached[1]
+
+    results = compute_scores(conn, year)
+    with _cache_lock:
+        _cache[key] = (versions, results)
+    return results
@@ -0,0 +1,236 @@
+# Server-side sessions.
+#
+# The cookie carries only a random session id; the session itself lives in
+# the sessions table, with user_id, role and full_name as columns so every
+# session of a user can be found, updated or revoked at once. An in-process
+# LRU cache sits in front of the table, so resolving the session of a
+# logged-in request is a dict lookup: the table is read only on a cache
+# miss, or when a cached entry is older than SESSION_CACHE_TTL seconds,
+# which bounds how long another worker process may keep honouring a
+# session revoked elsewhere. The table is written only when the session
+# changes (login, logout, flash messages) or is due for renewal.
+import copy
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from db import get_db
+
+DEFAULT_CONFIG = {
+    'SESSION_CACHE_SIZE': 10000,
+    'SESSION_CACHE_TTL': 30,            # seconds
+}
+
+# Session keys stored in their own columns; anything else goes into data
+COLUMNS = ('user_id', 'role', 'full_name')
+
+
+def create_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            role TEXT,
+            full_name TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            expires_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions(user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at)')
+
+
+class SessionCache:
+    # sid -> (session data, expires_at, loaded_at), least recently used first
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is not None:
+                self._entries.move_to_end(sid)
+            return entry
+
+    def put(self, sid, data, expires_at):
+        with self._lock:
+            self._entries[sid] = (data, expires_at, time.monotonic())
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def discard(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def discard_user(self, user_id):
+        with self._lock:
+            for sid in [sid for sid, entry in self._entries.items() if entry[0].get('user_id') == user_id]:
+                del self._entries[sid]
+
+    def update_user(self, user_id, **values):
+        with self._lock:
+            for sid, (data, expires_at, loaded_at) in self._entries.items():
+                if data.get('user_id') == user_id:
+                    self._entries[sid] = (dict(data, **values), expires_at, loaded_at)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = SessionCache(DEFAULT_CONFIG['SESSION_CACHE_SIZE'])
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.new = sid is None
+        self.sid = sid or secrets.token_urlsafe(32)
+        self.expires_at = expires_at
+        self.previous_sid = None
+        self.modified = False
+
+    def regenerate(self):
+        # New id for the same data, e.g. on login, so an id planted before
+        # authentication is worthless afterwards
+        if not self.new:
+            self.previous_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.modified = True
+
+
+def _load(conn, sid, now):
+    row = conn.execute(
+        'SELECT user_id, role, full_name, data, expires_at FROM sessions WHERE id = ?', (sid,)
+    ).fetchone()
+    if row is None or row['expires_at'] <= now:
+        return None, None
+    data = json.loads(row['data'])
+    for column in COLUMNS:
+        if row[column] is not None:
+            data[column] = row[column]
+    return data, row['expires_at']
+
+
+def _save(conn, sid, data, expires_at):
+    extra = {key: value for key, value in data.items() if key not in COLUMNS}
+    conn.execute('''
+        INSERT OR REPLACE INTO sessions (id, user_id, role, full_name, data, expires_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (sid, data.get('user_id'), data.get('role'), data.get('full_name'),
+          json.dumps(extra, ensure_ascii=False), expires_at))
+
+
+def _writer():
+    # The session is saved after the view returned; whatever the view left
+    # uncommitted would be rolled back at teardown, so it must not be
+    # committed here along with the session
+    conn = get_db()
+    if conn.in_transaction:
+        conn.rollback()
+    return conn
+
+
+class SQLiteSessionInterface(SessionInterface):
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid:
+            return ServerSession()
+
+        now = time.time()
+        entry = cache.get(sid)
+        if entry is not None and time.monotonic() - entry[2] < app.config['SESSION_CACHE_TTL']:
+            data, expires_at, _ = entry
+            if expires_at > now:
+                return ServerSession(copy.deepcopy(data), sid, expires_at)
+            cache.discard(sid)
+            return ServerSession()
+
+        data, expires_at = _load(get_db(), sid, now)
+        if data is None:
+            cache.discard(sid)
+            return ServerSession()
+        cache.put(sid, data, expires_at)
+        return ServerSession(copy.deepcopy(data), sid, expires_at)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.previous_sid or (not session and not session.new):
+            conn = _writer()
+            if session.previous_sid:
+                conn.execute('DELETE FROM sessions WHERE id = ?', (session.previous_sid,))
+                cache.discard(session.previous_sid)
+            if not session:
+                conn.execute('DELETE FROM sessions WHERE id = ?', (session.sid,))
+                cache.discard(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            conn.commit()
+        if not session:
+            return
+
+        now = time.time()
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        # Renew an unchanged session once half its lifetime has passed, so
+        # an active user is not logged out mid-term
+        renew = session.expires_at is not None and session.expires_at - now < lifetime / 2
+        if session.modified or session.new or renew:
+            expires_at = now + lifetime
+            conn = _writer()
+            if session.new:
+                conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,))
+            _save(conn, session.sid, dict(session), expires_at)
+            conn.commit()
+            cache.put(session.sid, copy.deepcopy(dict(session)), expires_at)
+
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def revoke_user_sessions(conn, user_id):
+    # Log a user out everywhere
+    conn.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))
+    cache.discard_user(user_id)
+
+
+def revoke_all_sessions(conn):
+    conn.execute('DELETE FROM sessions')
+    cache.clear()
+
+
+def update_user_sessions(conn, user_id, **values):
+    # Push a changed role or name (keys from COLUMNS) into the user's live
+    # sessions
+    assignments = ', '.join(f'{column} = ?' for column in values)
+    conn.execute(f'UPDATE sessions SET {assignments} WHERE user_id = ?', list(values.values()) + [user_id])
+    cache.update_user(user_id, **values)
+
+
+def init_app(app):
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+    cache.size = app.config['SESSION_CACHE_SIZE']
+    app.session_interface = SQLiteSessionInterface()
@@ -0,0 +1,26 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.py migrates its database on import: give the tests a scratch one
+os.environ.setdefault('FLASK_DATABASE', os.path.join(tempfile.mkdtemp(prefix='form_app_tests_'), 'academic.db'))
+os.environ.setdefault('FLASK_PASSWORD_HASH_WORKERS', '0')
+
+
+@pytest.fixture
+def app():
+    from app import app
+    return app
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['role'] = 'admin'
+    return client
@@ -0,0 +1,27 @@
+import pytest
+
+from categories import PUBLISHER_CONFERENCE, PUBLISHER_JOURNAL, RESEARCH_ACCEPTED, RESEARCH_PUBLISHED, classify
+
+
+@pytest.mark.parametrize('category, label, code', [
+    ('research_type', 'بحث منشور', RESEARCH_PUBLISHED),
+    ('research_type', '  بحث   مقبول للنشر ', RESEARCH_ACCEPTED),
+    ('publisher', 'مجلة علمية محكمة', PUBLISHER_JOURNAL),
+    ('publisher', 'ندوة', PUBLISHER_CONFERENCE),
+    ('participation_type', 'ورقة عمل', 3),
+    # Listed first, so a community task at the university is still coded 4
+    ('task_level', 'المسؤولية المجتمعية في الجامعة', 4),
+    ('task_level', 'الكلية', 2),
+])
+def test_classify(category, label, code):
+    assert classify(category, label) == code
+
+
+def test_classify_normalizes_arabic_spelling():
+    # Taa marbuta is folded to haa before matching
+    assert classify('publisher', 'مجله') == PUBLISHER_JOURNAL
+
+
+@pytest.mark.parametrize('label', ['', '   ', 'something else'])
+def test_unknown_labels_have_no_code(label):
+    assert classify('research_type', label) is None
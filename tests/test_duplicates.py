@@ -0,0 +1,25 @@
+import duplicates
+
+
+def test_identical_texts_have_identical_signatures():
+    text = 'Which enzyme produces ATP in the mitochondria?'
+    assert duplicates.signature(text) == duplicates.signature(text)
+    # Case and spacing are normalized away
+    assert duplicates.signature(text) == duplicates.signature('  which ENZYME produces ATP in the   mitochondria?')
+
+
+def test_similar_texts_share_a_band():
+    first = duplicates.signature('Which enzyme produces ATP in the mitochondria of the cell?')
+    second = duplicates.signature('Which enzyme produces ATP in the mitochondria of a cell?')
+    assert duplicates.similarity(first, second) >= duplicates.THRESHOLD
+    assert set(duplicates._buckets(first)) & set(duplicates._buckets(second))
+
+
+def test_unrelated_texts_are_not_similar():
+    first = duplicates.signature('Which enzyme produces ATP in the mitochondria?')
+    second = duplicates.signature('Name the bones of the human forearm.')
+    assert duplicates.similarity(first, second) < 0.3
+
+
+def test_empty_text_has_a_full_signature():
+    assert len(duplicates.signature('')) == duplicates.NUM_HASHES
@@ -0,0 +1,30 @@
+from db import get_db
+from forms import FORMS
+
+
+def _semester(**fields):
+    form = {'semester': '1', 'course_code': 'BIO101', 'num_students': '30',
+            'teaching_load': '12', 'credit_hours': '3'}
+    form.update(fields)
+    return form
+
+
+def test_semester_teaching_load_must_be_a_whole_number(admin_client):
+    response = admin_client.post('/semester_add', data=_semester(teaching_load='twelve'))
+    assert response.status_code == 400
+
+
+def test_semester_teaching_load_is_stored_as_an_integer(app, admin_client):
+    response = admin_client.post('/semester_add', data=_semester(course_code='LOAD42', teaching_load='42'))
+    assert response.status_code == 302
+    with app.app_context():
+        row = get_db().execute(
+            "SELECT typeof(teaching_load), teaching_load FROM academic_data WHERE course_code = 'LOAD42'"
+        ).fetchone()
+    assert tuple(row) == ('integer', 42)
+
+
+def test_semester_validate_converts_numbers():
+    schema = FORMS['semester']
+    values = dict(zip(schema['columns'][1:], schema['validate'](_semester())))
+    assert values['teaching_load'] == 12
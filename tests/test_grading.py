@@ -0,0 +1,34 @@
+import pytest
+
+import grading
+from db import get_db
+
+
+def test_parse_options_lettered():
+    assert grading.parse_options('A. first\nb) second\n\nC - third') == [
+        ('A', 'first'), ('B', 'second'), ('C', 'third')]
+
+
+def test_parse_options_unlettered_lines_keyed_by_position():
+    assert grading.parse_options('ATP synthase\nBeta oxidation') == [
+        ('A', 'ATP synthase'), ('B', 'Beta oxidation')]
+
+
+def test_parse_options_needs_two_options():
+    with pytest.raises(ValueError):
+        grading.parse_options('A. only one\n\n')
+
+
+def test_parse_options_rejects_repeated_letters():
+    with pytest.raises(ValueError):
+        grading.parse_options('A. first\nA. second')
+
+
+def test_answer_key_does_not_keep_unknown_ids(app):
+    with app.app_context():
+        conn = get_db()
+        database = app.config['DATABASE']
+        unknown = [10 ** 9 + i for i in range(100)]
+        assert grading.answer_key(conn, database, unknown) == {}
+        keys = grading._keys[database][1]
+        assert not set(unknown) & set(keys)
@@ -0,0 +1,56 @@
+import io
+
+import pytest
+
+from importer import ImportFormatError, read_rows
+
+BAD_FILES = [
+    ('not_utf8.csv', 'username,semester\r\nx,الأول\r\n'.encode('cp1256') + b'\x81\xff\r\n'),
+    ('broken.xlsx', b'this is not a zip file'),
+    # csv refuses fields over its field size limit
+    ('huge_field.csv', b'username,semester\r\nx,' + b'a' * 200000 + b'\r\n'),
+]
+
+
+def test_csv_rows_skip_blank_lines():
+    rows = list(read_rows(io.BytesIO(b'username,semester\r\nsara,first\r\n\r\n,\r\n'), 'r.csv'))
+    assert rows == [{'username': 'sara', 'semester': 'first'}]
+
+
+def test_csv_with_bom():
+    rows = list(read_rows(io.BytesIO('﻿username\r\nsara\r\n'.encode('utf-8')), 'r.csv'))
+    assert rows == [{'username': 'sara'}]
+
+
+def test_cp1256_csv_is_decoded():
+    data = 'username,semester\r\nsara,الأول\r\n'.encode('cp1256')
+    rows = list(read_rows(io.BytesIO(data), 'r.csv'))
+    assert rows == [{'username': 'sara', 'semester': 'الأول'}]
+
+
+def test_unknown_extension():
+    with pytest.raises(ImportFormatError):
+        read_rows(io.BytesIO(b''), 'r.txt')
+
+
+@pytest.mark.parametrize('filename, data', BAD_FILES[1:])
+def test_unreadable_files_raise_import_format_error(filename, data):
+    with pytest.raises(ImportFormatError):
+        list(read_rows(io.BytesIO(data), filename))
+
+
+@pytest.mark.parametrize('filename, data', BAD_FILES)
+def test_import_route_never_fails_on_bad_files(admin_client, filename, data):
+    response = admin_client.post('/admin/import', data={
+        'dataset': 'semester',
+        'file': (io.BytesIO(data), filename),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 200
+
+
+def test_import_command_reports_bad_files(app, tmp_path):
+    path = tmp_path / 'broken.xlsx'
+    path.write_bytes(b'this is not a zip file')
+    result = app.test_cli_runner().invoke(args=['import-data', 'semester', str(path)])
+    assert result.exit_code == 1
+    assert 'Not a readable XLSX file' in result.output
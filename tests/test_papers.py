@@ -0,0 +1,29 @@
+import pytest
+
+from papers import COMPLEXITY_LEVELS, PaperSpecError, complexity_quotas
+
+
+def test_quotas_add_up_to_count():
+    quotas = complexity_quotas(10, {'K1': 0.3, 'K2': 0.3, 'K3': 0.4})
+    assert quotas == {'K1': 3, 'K2': 3, 'K3': 4}
+
+
+def test_percentages_and_fractions_agree():
+    assert complexity_quotas(20, {'K1': 25, 'K2': 75}) == complexity_quotas(20, {'K1': 0.25, 'K2': 0.75})
+
+
+def test_largest_remainder_rounding():
+    quotas = complexity_quotas(10, {'K1': 1, 'K2': 1, 'K3': 1})
+    assert sum(quotas.values()) == 10
+    assert sorted(quotas.values()) == [3, 3, 4]
+
+
+def test_empty_mix_spreads_over_every_level():
+    quotas = complexity_quotas(len(COMPLEXITY_LEVELS), {})
+    assert quotas == {level: 1 for level in COMPLEXITY_LEVELS}
+
+
+@pytest.mark.parametrize('mix', [{'K9': 1}, {'K1': 'half'}, {'K1': 0}, {'K1': 2, 'K2': -1}])
+def test_bad_mix_is_rejected(mix):
+    with pytest.raises(PaperSpecError):
+        complexity_quotas(10, mix)
@@ -0,0 +1,21 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from scoring import _department_ranks
+
+
+def test_competition_ranking_within_departments():
+    departments = np.array(['Bio', 'Chem', 'Bio', 'Bio', 'Chem', 'Bio'])
+    scores = np.array([90.0, 50.0, 80.0, 80.0, 70.0, 60.0])
+    ranks = _department_ranks(departments, scores)
+    assert ranks.tolist() == [1, 2, 2, 2, 1, 4]
+
+
+def test_all_tied():
+    ranks = _department_ranks(np.array(['A', 'A', 'A']), np.array([5.0, 5.0, 5.0]))
+    assert ranks.tolist() == [1, 1, 1]
+
+
+def test_empty():
+    assert _department_ranks(np.array([], dtype=str), np.array([], dtype=float)).tolist() == []
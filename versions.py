@@ -0,0 +1,78 @@
+# Per-table change counters.
+#
+# table_versions holds one counter per tracked table, bumped by triggers on
+# every insert, update and delete. Caches key their entries on these
+# counters, so a cached result is reused until the data under it changes,
+# whichever route, import or script made the change. user_versions does the
+# same for everything belonging to one user.
+
+def install_version_triggers(conn, tables):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    for table in tables:
+        conn.execute('INSERT OR IGNORE INTO table_versions (name) VALUES (?)', (table,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS version_{table}_{event.lower()}
+                AFTER {event} ON "{table}"
+                BEGIN
+                    UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+                END
+            ''')
+
+
+def table_versions(conn, tables):
+    placeholders = ', '.join('?' * len(tables))
+    versions = dict(conn.execute(
+        f'SELECT name, version FROM table_versions WHERE name IN ({placeholders})', list(tables)
+    ).fetchall())
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+def bump_table_versions(conn, tables):
+    # For changes the triggers do not see, e.g. a table recomputed from
+    # others; visible to every process once committed
+    placeholders = ', '.join('?' * len(tables))
+    conn.execute(f'UPDATE table_versions SET version = version + 1 WHERE name IN ({placeholders})', list(tables))
+
+
+def install_user_version_triggers(conn, tables):
+    # One counter per user, bumped by any change to that user's rows in
+    # tables (all with a user_id column) or to the user itself, for caches
+    # of a single user's records
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_versions (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    bump = '''
+        INSERT INTO user_versions (user_id, version) VALUES ({user}, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+    '''
+    for table, column in [('users', 'id')] + [(table, 'user_id') for table in tables]:
+        for event, rows in (('INSERT', ['NEW']), ('UPDATE', ['OLD', 'NEW']), ('DELETE', ['OLD'])):
+            body = bump.format(user=f'{rows[0]}.{column}')
+            if len(rows) == 2:
+                # A row moved to another user changes both users' records
+                body += f'''
+                    INSERT INTO user_versions (user_id, version)
+                    SELECT NEW.{column}, 1 WHERE NEW.{column} IS NOT OLD.{column}
+                    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+                '''
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS user_version_{table}_{event.lower()}
+                AFTER {event} ON "{table}"
+                BEGIN
+                    {body}
+                END
+            ''')
+
+
+def user_version(conn, user_id):
+    row = conn.execute('SELECT version FROM user_versions WHERE user_id = ?', (user_id,)).fetchone()
+    return row[0] if row else 0
@@ -0,0 +1,280 @@
+# Write-behind queue for form submissions.
+#
+# With WRITE_BEHIND on, a validated form submission is appended to this
+# process's journal file (one JSON line, fsynced) and queued in memory, and
+# the request returns without waiting for SQLite's write lock. One writer
+# thread per process drains the queue, inserting whatever has piled up in
+# a single transaction of at most WRITE_BEHIND_BATCH rows, so a deadline
+# rush costs one commit per batch instead of one per request.
+#
+# Every batch also records the sequence number of its last entry in
+# write_behind_state, in the same transaction, so a journal can be replayed
+# after a crash without inserting anything twice. Each process holds an
+# exclusive lock on its own journal; at startup journals left by dead
+# processes (unlocked) are replayed and removed. Once everything journaled
+# has been applied the journal is truncated. Entries SQLite rejects are
+# logged and copied to <journal>.failed instead of blocking the queue.
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+from db import connect
+from forms import FORMS, insert_records
+
+DEFAULT_CONFIG = {
+    'WRITE_BEHIND': False,
+    'WRITE_BEHIND_DIR': None,           # journal folder, the database's by default
+    'WRITE_BEHIND_BATCH': 500,          # rows per transaction
+}
+
+logger = logging.getLogger(__name__)
+
+_queue = queue.Queue()
+_journal = None
+_journal_lock = threading.Lock()
+_writer = None
+_pid = None
+_start_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def create_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS write_behind_state (
+            journal TEXT PRIMARY KEY,
+            applied_seq INTEGER NOT NULL
+        )
+    ''')
+
+
+class _Journal:
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.file = open(path, 'a+', encoding='utf-8')
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        self.last_seq = 0
+        self.applied_seq = 0
+
+    def append(self, entry):
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def truncate(self):
+        self.file.truncate(0)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+
+def _read_entries(path):
+    entries = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Torn by a crash mid-append, so never acknowledged
+                continue
+    return entries
+
+
+def _applied_seq(conn, name):
+    row = conn.execute('SELECT applied_seq FROM write_behind_state WHERE journal = ?', (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def _record_failure(path, entry, error):
+    logger.error('write-behind entry %s of %s rejected: %s', entry['seq'], os.path.basename(path), error)
+    with open(path + '.failed', 'a', encoding='utf-8') as f:
+        f.write(json.dumps(dict(entry, error=str(error)), ensure_ascii=False) + '\n')
+
+
+def _apply(conn, journal_path, entries):
+    # Insert entries (all from one journal, in order) and mark them applied.
+    # Entries already marked are skipped, so a retried batch is harmless.
+    name = os.path.basename(journal_path)
+    applied_seq = _applied_seq(conn, name)
+    entries = [entry for entry in entries if entry['seq'] > applied_seq]
+    if not entries:
+        return 0, 0
+    mark = 'INSERT OR REPLACE INTO write_behind_state (journal, applied_seq) VALUES (?, ?)'
+    try:
+        by_form = {}
+        for entry in entries:
+            by_form.setdefault(entry['form'], []).append((entry['user_id'],) + tuple(entry['values']))
+        for form, rows in by_form.items():
+            insert_records(conn, FORMS[form], rows)
+        conn.execute(mark, (name, entries[-1]['seq']))
+        conn.commit()
+        return len(entries), 0
+    except (sqlite3.IntegrityError, sqlite3.InterfaceError, KeyError):
+        conn.rollback()
+
+    # One bad row must not sink the batch: retry one entry at a time
+    applied = failed = 0
+    for entry in entries:
+        try:
+            insert_records(conn, FORMS[entry['form']], [(entry['user_id'],) + tuple(entry['values'])])
+            applied += 1
+        except (sqlite3.IntegrityError, sqlite3.InterfaceError, KeyError) as e:
+            conn.rollback()
+            _record_failure(journal_path, entry, e)
+            failed += 1
+        conn.execute(mark, (name, entry['seq']))
+        conn.commit()
+    return applied, failed
+
+
+def _recover(conn, directory, pattern):
+    # Replay the journals of processes that died with entries unapplied
+    for path in sorted(glob.glob(os.path.join(directory, pattern))):
+        with open(path, encoding='utf-8') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # a live process's journal
+            name = os.path.basename(path)
+            entries = _read_entries(path)
+            if entries:
+                logger.warning('replaying write-behind journal %s', name)
+                _apply(conn, path, entries)
+            conn.execute('DELETE FROM write_behind_state WHERE journal = ?', (name,))
+            conn.commit()
+            os.remove(path)
+
+
+def _run(database, config, batch_size):
+    conn = connect(database, config)
+    while True:
+        entry = _queue.get()
+        if entry is None:
+            break
+        batch = [entry]
+        while len(batch) < batch_size:
+            try:
+                entry = _queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                _queue.put(None)
+                break
+            batch.append(entry)
+
+        started = time.monotonic()
+        while True:
+            try:
+                applied, failed = _apply(conn, _journal.path, [entry for entry, _ in batch])
+                break
+            except sqlite3.Error as e:
+                # Locked or unavailable: entries must go in journal order,
+                # so the same batch is retried
+                logger.warning('write-behind batch of %d postponed: %s', len(batch), e)
+                conn.rollback()
+                time.sleep(1)
+        finished = time.monotonic()
+
+        with _journal_lock:
+            _journal.applied_seq = batch[-1][0]['seq']
+            if _journal.applied_seq == _journal.last_seq:
+                _journal.truncate()
+        with _stats_lock:
+            _stats['applied'] += applied
+            _stats['failed'] += failed
+            _stats['batches'] += 1
+            _stats['last_batch_size'] = len(batch)
+            _stats['last_flush_ms'] = round((finished - started) * 1000, 2)
+            _stats['max_flush_ms'] = max(_stats['max_flush_ms'], _stats['last_flush_ms'])
+            # From the request being answered to its row being committed
+            _stats['last_delay_ms'] = round((finished - batch[0][1]) * 1000, 2)
+            _stats['max_delay_ms'] = max(_stats['max_delay_ms'], _stats['last_delay_ms'])
+    conn.close()
+
+
+def running():
+    # A forked worker inherits neither the thread nor, usefully, the queue
+    return _writer is not None and _writer.is_alive() and _pid == os.getpid()
+
+
+def submit(form, user_id, values):
+    # Journal one validated submission of FORMS[form] and queue it
+    if not running():
+        start(current_app)
+    with _journal_lock:
+        entry = {'seq': _journal.last_seq + 1, 'form': form, 'user_id': user_id, 'values': list(values)}
+        _journal.append(entry)
+        _journal.last_seq = entry['seq']
+        _queue.put((entry, time.monotonic()))
+    with _stats_lock:
+        _stats['submitted'] += 1
+
+
+def status():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['enabled'] = running()
+    stats['depth'] = _queue.qsize()
+    return stats
+
+
+def start(app):
+    # Recover dead processes' journals and start this process's writer;
+    # submit() calls it on first use, calling it at startup recovers early
+    global _journal, _writer, _queue, _pid
+    with _start_lock:
+        if not app.config['WRITE_BEHIND'] or running() or multiprocessing.parent_process() is not None:
+            return
+        database = app.config['DATABASE']
+        directory = app.config['WRITE_BEHIND_DIR'] or os.path.dirname(os.path.abspath(database))
+        prefix = os.path.basename(database) + '.writebehind'
+        path = os.path.join(directory, f'{prefix}.{os.getpid()}.jsonl')
+
+        conn = connect(database, app.config)
+        try:
+            # Includes a journal left by an earlier process with this pid
+            _recover(conn, directory, f'{prefix}.*.jsonl')
+            conn.execute('DELETE FROM write_behind_state WHERE journal = ?', (os.path.basename(path),))
+            conn.commit()
+        finally:
+            conn.close()
+
+        first = _pid is None
+        _journal = _Journal(path)
+        _queue = queue.Queue()
+        _pid = os.getpid()
+        _stats.update(submitted=0, applied=0, failed=0, batches=0, last_batch_size=0,
+                      last_flush_ms=None, max_flush_ms=0, last_delay_ms=None, max_delay_ms=0)
+        _writer = threading.Thread(target=_run, name='write-behind', daemon=True,
+                                   args=(database, app.config, app.config['WRITE_BEHIND_BATCH']))
+        _writer.start()
+        if first:
+            atexit.register(stop)
+
+
+def stop(timeout=10):
+    # Let the writer finish what is queued; whatever it cannot is still in
+    # the journal and is replayed at the next start
+    global _writer, _journal
+    if running():
+        _queue.put(None)
+        _writer.join(timeout)
+        with _journal_lock:
+            _journal.file.close()
+            _journal = None
+    _writer = None
+
+
+def init_app(app):
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)